@@ -0,0 +1,408 @@
+#-*- coding: utf-8 -*-
+"""
+Single-thread speech loader for online text-to-speech services, keeping many
+chunk requests in flight at once over non-blocking keep-alive HTTP
+connections, as an alternative to the worker threads of speech.SpeechLoader.
+
+Used via speech.make_loader() when conf.FetchEngine is "async".
+
+------------------------------------------------------------------------------
+This file is part of TextSpeak - a simple text-to-speech program.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+"""
+import asyncore
+import collections
+import heapq
+import itertools
+import socket
+import sys
+import threading
+import time
+import traceback
+import urlparse
+
+import conf
+import speech
+
+
+class AsyncSpeechLoader(speech.SpeechLoader):
+    """
+    Speech loader fetching chunks in one engine thread, with up to
+    conf.AsyncRequests HTTP requests in flight over non-blocking sockets.
+    Has the same interface as SpeechLoader: load() generates chunk results
+    in order, to be consumed synchronously from any thread, chunk window
+    and request limit keeping memory bounded. Retries, circuit breaker,
+    request rate limit and job priorities apply as in SpeechLoader;
+    concurrency slots of RateLimiter are not taken, AsyncRequests caps
+    concurrency instead. Supports plain HTTP services only.
+    """
+    MAX_REDIRECTS = 5
+    POLL_INTERVAL = 0.02 # Seconds to wait for socket events and new tasks
+
+
+    def __init__(self, backend=None, max_requests=None):
+        """
+        @param   backend       Backend instance or name, by default
+                               conf.Backend, must provide get_url()
+        @param   max_requests  maximum requests in flight,
+                               by default conf.AsyncRequests
+        """
+        self.max_requests = max(1, max_requests or conf.AsyncRequests)
+        self.connect_timeout = conf.HttpConnectTimeout
+        self.read_timeout = conf.HttpReadTimeout
+        self.map = {} # asyncore socket map, {fileno: AsyncHttpConnection}
+        self.idle = collections.defaultdict(list) # {(host, port): [conn, ]}
+        self.addresses = {} # {(host, port): (family, resolved address)}
+        self.timers = [] # Heap of (due time, sequence, task) for deferred
+        self.sequence = itertools.count()
+        self.active = 0 # Number of tasks in flight
+        self.stats = {"requests": 0, "connects": 0, "reuses": 0, "errors": 0}
+        speech.SpeechLoader.__init__(self, backend)
+        self.window = self.max_requests
+
+
+    def start_workers(self):
+        """Starts the engine thread."""
+        worker = threading.Thread(target=self.run)
+        worker.daemon = True # Daemon threads do not keep program running
+        worker.start()
+
+
+    def run(self):
+        """Engine loop: starts queued tasks and handles socket events."""
+        while True:
+            try:
+                self.start_tasks()
+                self.check_timeouts()
+                if self.map:
+                    asyncore.loop(self.POLL_INTERVAL, True, self.map, 1)
+                else:
+                    time.sleep(self.POLL_INTERVAL)
+            except Exception:
+                traceback.print_exc()
+
+
+    def start_tasks(self):
+        """Starts due deferred tasks and queued tasks, up to request limit."""
+        while self.active < self.max_requests:
+            if self.timers and self.timers[0][0] <= time.time():
+                task = heapq.heappop(self.timers)[-1]
+            else:
+                item = self.next_task(block=False)
+                if not item:
+                    break # while self.active
+                job, (lang, text) = item
+                task = {"job": job, "key": (lang, text), "lang": lang,
+                        "text": text, "attempt": 0, "error": None}
+            if not self.start_task(task):
+                break # while self.active; rate limited
+
+
+    def start_task(self, task):
+        """
+        Starts requesting task audio, or finishes task if its job was
+        stopped or circuit breaker is open.
+
+        @return  False if rate limit deferred the task, True otherwise
+        """
+        if self.is_stopped(task["key"]):
+            self.finish(task, None, task["error"])
+        elif not self.breaker.allow():
+            error = task["error"] or self.get_breaker_error()
+            self.finish(task, None, error)
+        else:
+            wait = self.limiter.update_bucket(take=True)
+            if wait:
+                self.breaker.release() # Trial call, if any, not made yet
+                self.defer(task, wait)
+                return False
+            self.active += 1
+            task.update(active=True, redirects=0, started=time.time(),
+                        url=self.backend.get_url(task["text"], task["lang"]))
+            self.request(task)
+        return True
+
+
+    def request(self, task, fresh=False):
+        """
+        Sends task request on an idle keep-alive connection to the host,
+        or on a new connection.
+        """
+        parts = urlparse.urlsplit(task["url"])
+        key = (parts.hostname, parts.port or 80)
+        path = (parts.path or "/") + ("?%s" % parts.query if parts.query else "")
+        host = parts.hostname + (":%s" % parts.port if parts.port else "")
+        headers = dict(getattr(self.backend, "HEADERS", {}), Host=host)
+        data = "GET %s HTTP/1.1\r\n%s\r\n" % (path, "".join(
+               "%s: %s\r\n" % x for x in headers.items()))
+        if not fresh:
+            self.stats["requests"] += 1
+        connection = None if fresh or not self.idle[key] \
+                     else self.idle[key].pop()
+        try:
+            if connection:
+                self.stats["reuses"] += 1
+            else:
+                connection = AsyncHttpConnection(self, key)
+                self.stats["connects"] += 1
+            connection.send_request(task, data)
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.on_failure(task, e)
+
+
+    def resolve(self, key):
+        """Returns (address family, socket address) for (host, port)."""
+        if key not in self.addresses:
+            family, _, _, _, address = socket.getaddrinfo(key[0], key[1],
+                socket.AF_UNSPEC, socket.SOCK_STREAM)[0]
+            self.addresses[key] = (family, address)
+        return self.addresses[key]
+
+
+    def check_timeouts(self):
+        """Fails requests that have waited for too long."""
+        now = time.time()
+        for connection in self.map.values():
+            if connection.task and connection.deadline < now:
+                connection.fail(socket.timeout("timed out"))
+
+
+    def on_response(self, connection, task, status, reason, headers,
+                    content, keep_alive):
+        """Handles a complete HTTP response, following redirects."""
+        if keep_alive and connection.connected \
+        and len(self.idle[connection.key]) < self.max_requests:
+            self.idle[connection.key].append(connection)
+        else:
+            connection.close()
+        if status in (301, 302, 303, 307, 308) and "location" in headers \
+        and task["redirects"] < self.MAX_REDIRECTS:
+            task["url"] = urlparse.urljoin(task["url"], headers["location"])
+            task["redirects"] += 1
+            self.request(task)
+        elif 200 <= status < 300:
+            self.breaker.success()
+            self.finish(task, content, None)
+        else:
+            reason = reason if task["redirects"] < self.MAX_REDIRECTS \
+                     else "Too many redirects"
+            self.on_failure(task, speech.HttpError(task["url"], status,
+                                                   reason, headers))
+
+
+    def on_connection_error(self, connection, task, exc):
+        """
+        Handles a failed connection, retrying once on a fresh connection
+        if a reused one had gone stale.
+        """
+        self.discard(connection)
+        if task and connection.reused and not connection.received:
+            self.request(task, fresh=True)
+        elif task:
+            self.stats["errors"] += 1
+            self.on_failure(task, exc)
+
+
+    def on_failure(self, task, exc):
+        """Handles a failed request, deferring a retry if any left."""
+        task["job"]["timings"].count("fetch errors")
+        error = speech.SpeechError("Error accessing the %s.\n\nURL: %s\n\n"
+                                   "%s: %s" % (self.backend.title,
+                                   task["url"].replace("?", "?\n"),
+                                   exc.__class__.__name__, exc), cause=exc)
+        task["error"], delay = self.handle_failure(task["attempt"], error)
+        task["attempt"] += 1
+        if delay is None or task["attempt"] >= conf.FetchRetries \
+        or self.is_stopped(task["key"]):
+            self.finish(task, None, task["error"])
+        else:
+            self.defer(task, delay)
+
+
+    def defer(self, task, delay):
+        """Puts task aside to be started again after delay seconds."""
+        self.end_attempt(task)
+        item = (time.time() + delay, next(self.sequence), task)
+        heapq.heappush(self.timers, item)
+
+
+    def finish(self, task, content, error):
+        """Stores (content, error) into results of jobs waiting for task."""
+        self.end_attempt(task)
+        self.deliver(task["key"], content, error)
+
+
+    def end_attempt(self, task):
+        """Marks task as no longer in flight, recording request duration."""
+        if task.pop("active", False):
+            self.active -= 1
+            duration = time.time() - task.pop("started")
+            task["job"]["timings"].add("fetch", duration)
+
+
+    def discard(self, connection):
+        """Removes connection from idle connections."""
+        if connection in self.idle[connection.key]:
+            self.idle[connection.key].remove(connection)
+
+
+    def get_stats(self):
+        """
+        Returns a dictionary of connection statistics: requests, connects,
+        reuses, errors, idle connections, and requests in flight.
+        """
+        return dict(self.stats, active=self.active,
+                    idle=sum(map(len, self.idle.values())))
+
+
+
+class AsyncHttpConnection(asyncore.dispatcher):
+    """
+    Non-blocking HTTP/1.1 client connection for AsyncSpeechLoader, sending
+    one request at a time and parsing responses with Content-Length,
+    chunked transfer encoding or reading until close.
+    """
+
+    def __init__(self, loader, key):
+        """
+        @param   loader  AsyncSpeechLoader, notified of results
+        @param   key     (host, port) to connect to
+        """
+        asyncore.dispatcher.__init__(self, map=loader.map)
+        self.loader, self.key = loader, key
+        self.task = None # Task of the request underway
+        self.reused = False # Whether connection was taken from idle
+        self.received = False # Whether any response data was received
+        self.outbuf = self.inbuf = ""
+        family, address = loader.resolve(key)
+        self.create_socket(family, socket.SOCK_STREAM)
+        self.deadline = time.time() + loader.connect_timeout
+        try:
+            self.connect(address)
+        except Exception:
+            self.close()
+            raise
+
+
+    def send_request(self, task, data):
+        """Starts sending request data for task."""
+        self.task, self.outbuf, self.inbuf = task, data, ""
+        self.received = False
+        self.version = self.status = self.reason = self.headers = None
+        self.chunked, self.length, self.chunk, self.body = False, None, None, []
+        timeout = self.loader.read_timeout if self.connected \
+                  else self.loader.connect_timeout
+        self.deadline = time.time() + timeout
+
+
+    def fail(self, exc):
+        """Closes connection and reports the error for the request."""
+        self.close()
+        task, self.task = self.task, None
+        self.loader.on_connection_error(self, task, exc)
+
+
+    def writable(self):
+        return bool(self.outbuf) or not self.connected
+
+
+    def handle_connect(self):
+        self.deadline = time.time() + self.loader.read_timeout
+
+
+    def handle_write(self):
+        sent = self.send(self.outbuf)
+        self.outbuf = self.outbuf[sent:]
+
+
+    def handle_read(self):
+        data = self.recv(speech.COPY_BUFFER_SIZE)
+        if data and self.task:
+            self.received = True
+            self.deadline = time.time() + self.loader.read_timeout
+            self.inbuf += data
+            self.parse()
+
+
+    def handle_close(self):
+        self.close()
+        task, self.task = self.task, None
+        if task and self.headers is not None and self.length is None \
+        and not self.chunked: # Response delimited by closing connection
+            self.loader.on_response(self, task, self.status, self.reason,
+                self.headers, "".join(self.body) + self.inbuf, False)
+        else:
+            error = socket.error("Connection closed by server.")
+            self.loader.on_connection_error(self, task, error)
+
+
+    def handle_error(self):
+        self.fail(sys.exc_info()[1])
+
+
+    def parse(self):
+        """Parses received data, reporting response when complete."""
+        if self.headers is None:
+            end = self.inbuf.find("\r\n\r\n")
+            if end < 0:
+                return
+            head, self.inbuf = self.inbuf[:end], self.inbuf[end + 4:]
+            lines = head.split("\r\n")
+            status_line = lines[0].split(None, 2)
+            self.version, self.status = status_line[0], int(status_line[1])
+            self.reason = status_line[2] if len(status_line) > 2 else ""
+            pairs = [x.split(":", 1) for x in lines[1:] if ":" in x]
+            self.headers = dict((k.strip().lower(), v.strip()) for k, v in pairs)
+            if 100 <= self.status < 200: # Interim response, wait for final
+                self.headers = None
+                return self.parse()
+            encoding = self.headers.get("transfer-encoding", "").lower()
+            self.chunked = "chunked" in encoding
+            if self.status in (204, 304):
+                self.length = 0
+            elif not self.chunked and "content-length" in self.headers:
+                self.length = int(self.headers["content-length"])
+
+        if self.chunked:
+            while True:
+                if self.chunk is None:
+                    end = self.inbuf.find("\r\n")
+                    if end < 0:
+                        return
+                    self.chunk = int(self.inbuf[:end].split(";")[0], 16)
+                    self.inbuf = self.inbuf[end + 2:]
+                if not self.chunk: # Last chunk, followed by any trailers
+                    if self.inbuf.startswith("\r\n"):
+                        end = 2
+                    else:
+                        end = self.inbuf.find("\r\n\r\n")
+                        if end < 0:
+                            return
+                        end += 4
+                    self.inbuf = self.inbuf[end:]
+                    return self.complete("".join(self.body))
+                if len(self.inbuf) < self.chunk + 2:
+                    return
+                self.body.append(self.inbuf[:self.chunk])
+                self.inbuf = self.inbuf[self.chunk + 2:]
+                self.chunk = None
+        elif self.length is not None and len(self.inbuf) >= self.length:
+            content = self.inbuf[:self.length]
+            self.inbuf = self.inbuf[self.length:]
+            self.complete(content)
+
+
+    def complete(self, content):
+        """Reports a complete response to the loader."""
+        connection = self.headers.get("connection", "").lower()
+        keep_alive = ("close" != connection) if "HTTP/1.1" == self.version \
+                     else ("keep-alive" == connection)
+        task, self.task = self.task, None
+        self.reused = True # Next request will be on a used connection
+        self.loader.on_response(self, task, self.status, self.reason,
+                                self.headers, content, keep_alive)
@@ -0,0 +1,286 @@
+#-*- coding: utf-8 -*-
+"""
+Performance benchmarks for TextSpeak: text parsing speed on generated corpora
+of various sizes, and end-to-end synthesis and merging throughput against a
+local stand-in for the text-to-speech service, with configurable latency and
+error rate.
+
+Usage: python benchmark.py [--sizes 1,10,100,1000,10000] [--latency 50] ..
+
+------------------------------------------------------------------------------
+This file is part of TextSpeak - a simple text-to-speech program.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+"""
+import argparse
+import BaseHTTPServer
+import os
+import random
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+import asyncloader
+import conf
+import speech
+
+
+"""Words for generating corpora, with punctuation and pause markers."""
+WORDS = ("the quick brown fox jumps over a lazy dog while several other "
+         "animals watch from behind large green trees near the river bank "
+         "and nobody seems to notice anything unusual today").split()
+PUNCTUATION = [",", ".", "?", "!", ";", ":"]
+
+
+class FakeTTSServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Local HTTP stand-in for the text-to-speech service, serving canned MP3
+    with configurable latency and error rate.
+    """
+    daemon_threads = True
+    request_queue_size = 128 # Avoid refused connections under many workers
+
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0,
+                 content=speech.SILENCE * 4):
+        """
+        @param   latency     seconds to delay each response
+        @param   jitter      maximum random seconds added to latency
+        @param   error_rate  ratio of requests to fail with HTTP 503 (0..1)
+        @param   content     MP3 data to serve
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0),
+                                           FakeTTSHandler)
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.content = error_rate, content
+        self.requests = 0
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def get_url(self):
+        """Returns the URL template for GoogleBackend.URL."""
+        return "http://%s:%s/translate_tts?tl=%%s&q=%%s" % self.server_address
+
+
+
+class FakeTTSHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Request handler for FakeTTSServer."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Headers and body go in separate writes
+
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.latency + random.random() * server.jitter)
+        if random.random() < server.error_rate:
+            body, code = "Service unavailable", 503
+        else:
+            body, code = server.content, 200
+        self.send_response(code)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        pass # Keep output clean
+
+
+
+class TimedBackend(speech.GoogleBackend):
+    """
+    GoogleBackend pointed at a local server, recording chunk latencies
+    when synthesizing via worker threads, or via TimedAsyncLoader.
+    """
+    name = "benchmark"
+
+
+    def __init__(self, url):
+        speech.GoogleBackend.__init__(self)
+        self.URL = url
+        self.latencies = []
+        self.lock = threading.Lock()
+
+
+    def synthesize(self, text, lang):
+        start = time.time()
+        try:
+            return speech.GoogleBackend.synthesize(self, text, lang)
+        finally:
+            with self.lock:
+                self.latencies.append(time.time() - start)
+
+
+
+class TimedAsyncLoader(asyncloader.AsyncSpeechLoader):
+    """AsyncSpeechLoader recording request latencies into TimedBackend."""
+
+    def end_attempt(self, task):
+        started = task.get("started") if task.get("active") else None
+        asyncloader.AsyncSpeechLoader.end_attempt(self, task)
+        if started is not None:
+            with self.backend.lock:
+                self.backend.latencies.append(time.time() - started)
+
+
+
+def make_corpus(size, seed=0):
+    """Returns a deterministic pseudo-random text of given size in bytes."""
+    rnd, words, length = random.Random(seed), [], 0
+    while length < size:
+        word = rnd.choice(WORDS)
+        roll = rnd.random()
+        if roll < 0.08:
+            word += rnd.choice(PUNCTUATION)
+        elif roll < 0.09:
+            word += "\n"
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size].strip()
+
+
+def get_peak_rss():
+    """Returns peak resident memory of this process in megabytes, or None."""
+    if not resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024. * 1024 if "darwin" == sys.platform else 1024.)
+
+
+def percentile(values, ratio):
+    """Returns the value at ratio (0..1) in values, or 0 if empty."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(ratio * len(values)))] \
+           if values else 0
+
+
+def format_bytes(size):
+    """Returns a human-readable string for a size in bytes."""
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return "%.1f %s" % (size, unit)
+        size /= 1024.
+    return "%.1f GB" % size
+
+
+def bench_parse(sizes, out):
+    """Times parse_text() on corpora of given sizes in kilobytes."""
+    out.write("parse_text:\n")
+    out.write("%12s %10s %10s %14s\n" % ("size", "chunks", "seconds",
+                                         "throughput"))
+    for kb in sizes:
+        text = make_corpus(kb * 1024)
+        start = time.time()
+        chunks = speech.parse_text(text)
+        elapsed = max(time.time() - start, 1e-9)
+        out.write("%12s %10s %10.3f %12s/s\n" % (format_bytes(len(text)),
+                  len(chunks), elapsed, format_bytes(len(text) / elapsed)))
+    out.write("\n")
+
+
+def bench_speech(size, workers, latency, jitter, error_rate, out,
+                 engine="threads"):
+    """
+    Times end-to-end synthesis and merging of a corpus against a local fake
+    service, once for each worker count, as requests in flight for the
+    async engine.
+    """
+    server = FakeTTSServer(latency, jitter, error_rate)
+    text = make_corpus(size * 1024, seed=1)
+    out.write("Synthesis and merge of %s with %s engine, %s ms latency "
+              "(+%s jitter), %.0f%% errors:\n" % (format_bytes(len(text)),
+              engine, latency * 1000, jitter * 1000, error_rate * 100))
+    out.write("%8s %8s %9s %10s %12s %9s %6s %9s %9s %10s\n" % ("workers",
+              "chunks", "seconds", "chunks/s", "output/s", "requests",
+              "conns", "p50 ms", "p99 ms", "peak RSS"))
+    cache_limit = conf.CacheSizeLimit
+    conf.CacheSizeLimit = 0 # Measure the service, not the cache
+    try:
+        for count in workers:
+            conf.FetchWorkers = conf.FetchWorkersPerHost = count
+            conf.AsyncRequests = count
+            backend = TimedBackend(server.get_url())
+            loader = TimedAsyncLoader(backend) if "async" == engine \
+                     else speech.make_loader(backend, engine)
+            fd, filename = tempfile.mkstemp(suffix=".mp3")
+            os.close(fd)
+            server.requests, chunks, error = 0, 0, None
+            start = time.time()
+            try:
+                with speech.SpeechWriter(filename) as writer:
+                    for i, chunk, content, _ in loader.load(text, "en"):
+                        writer.write(chunk, content)
+                        chunks += 1
+            except speech.SpeechError as e:
+                error = str(e).split("\n")[0]
+            elapsed = max(time.time() - start, 1e-9)
+            size_out = os.path.getsize(filename)
+            os.unlink(filename)
+            rss = get_peak_rss()
+            p50, p99 = ["%.1f" % (percentile(backend.latencies, x) * 1000)
+                        if backend.latencies else "n/a" for x in (0.5, 0.99)]
+            out.write("%8s %8s %9.2f %10.1f %10s/s %9s %6s %9s %9s %10s\n"
+                      % (count, chunks, elapsed, chunks / elapsed,
+                      format_bytes(size_out / elapsed), server.requests,
+                      loader.get_stats()["connects"], p50, p99,
+                      "%.1f MB" % rss if rss is not None else "n/a"))
+            if error:
+                out.write("%8s %s\n" % ("", error))
+    finally:
+        conf.CacheSizeLimit = cache_limit
+        server.shutdown()
+    out.write("\n")
+
+
+def main():
+    """Entry point for command-line use, runs benchmarks."""
+    int_list = lambda s: [int(x) for x in s.split(",") if x.strip()]
+    argparser = argparse.ArgumentParser(description="Benchmarks TextSpeak "
+        "text parsing, and speech synthesis against a local fake service.")
+    argparser.add_argument("--sizes", type=int_list, default="1,10,100,1000,"
+        "10000", help="parse corpus sizes in KB (default %(default)s)")
+    argparser.add_argument("--size", type=int, default=20,
+        help="synthesis corpus size in KB (default %(default)s)")
+    argparser.add_argument("--workers", type=int_list, default="1,4,16",
+        help="synthesis worker counts to try (default %(default)s)")
+    argparser.add_argument("--latency", type=float, default=50,
+        help="fake service latency in milliseconds (default %(default)s)")
+    argparser.add_argument("--jitter", type=float, default=20,
+        help="fake service maximum random extra latency in milliseconds "
+             "(default %(default)s)")
+    argparser.add_argument("--error-rate", type=float, default=0,
+        help="fake service ratio of failed requests, 0..1 "
+             "(default %(default)s)")
+    argparser.add_argument("--engine", default="threads",
+        choices=["threads", "async"], help="speech fetch engine "
+        "(default %(default)s)")
+    argparser.add_argument("--skip-parse", action="store_true",
+        help="skip parse_text benchmark")
+    argparser.add_argument("--skip-speech", action="store_true",
+        help="skip synthesis benchmark")
+    args = argparser.parse_args()
+
+    if not args.skip_parse:
+        bench_parse(args.sizes, sys.stdout)
+    if not args.skip_speech:
+        bench_speech(args.size, args.workers, args.latency / 1000.,
+                     args.jitter / 1000., args.error_rate, sys.stdout,
+                     args.engine)
+
+
+if "__main__" == __name__:
+    main()
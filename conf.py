@@ -18,6 +18,7 @@ import datetime
 import json
 import os
 import sys
+import tempfile
 
 """Program title, version number and version date."""
 Title = "TextSpeak"
@@ -65,11 +66,109 @@ InfoText = "Simple text-to-speech program, feeds text in blocks to " \
            "audio into one MP3."
 
 """
-The number of silent chunks inserted between text chunks, for shorter pauses
-(after commas and like) and longer pauses (between sentences).
+Pause durations in milliseconds inserted after text chunks, by the marks
+ending the chunk: longer pauses between sentences, shorter after commas and
+like. Pauses are rounded to whole MP3 frames of speech audio (~24..36ms).
 """
-SilenceCountShort = 2
-SilenceCountLong  = 4
+PauseDurations = {".?!": 1000, ",:;()": 500}
+
+"""Pause duration in milliseconds for each SilenceMarker in text."""
+PauseMarker = 500
+
+"""
+Text-to-speech backend: "google" for the Google Translate online service,
+"espeak" for the offline eSpeak synthesizer (requires espeak and lame),
+"fake" for a silent offline stand-in for testing.
+"""
+Backend = "google"
+
+"""Number of background workers downloading audio chunks in parallel."""
+FetchWorkers = 4
+
+"""Maximum number of concurrent requests to any single host."""
+FetchWorkersPerHost = 4
+
+"""
+Engine for fetching speech from online services: "threads" for a pool of
+FetchWorkers threads, or "async" for a single thread multiplexing up to
+AsyncRequests requests over non-blocking sockets.
+"""
+FetchEngine = "threads"
+AsyncRequests = 100
+
+"""Maximum number of attempts at synthesizing a text chunk."""
+FetchRetries = 3
+
+"""Base delay in seconds for retrying, doubled on each further attempt."""
+FetchBackoff = 0.5
+
+"""Maximum delay in seconds for retrying, also caps server Retry-After."""
+FetchBackoffMax = 30
+
+"""
+Consecutive failures from the speech service after which further requests
+are skipped for CircuitBreakerCooldown seconds.
+"""
+CircuitBreakerThreshold = 5
+CircuitBreakerCooldown = 30
+
+"""
+Maximum requests per second to the speech service, shared by all TextSpeak
+threads and processes on this computer, 0 for unlimited; and the number of
+requests allowed at once when rate permits.
+"""
+RateLimit = 0
+RateLimitBurst = 5
+
+"""
+Maximum concurrent requests to the speech service from all TextSpeak
+processes on this computer, 0 for unlimited.
+"""
+RateLimitConcurrency = 0
+
+"""Directory for rate limiting state shared between processes."""
+RateLimitDirectory = os.path.join(tempfile.gettempdir(),
+                                  "%s-ratelimit" % Title.lower())
+
+"""Seconds to wait for establishing a connection to the speech service."""
+HttpConnectTimeout = 10
+
+"""Seconds to wait for data from the speech service on a connection."""
+HttpReadTimeout = 30
+
+"""
+Directory for the persistent cache of downloaded audio chunks, kept in a few
+segment files of appended chunks and their index.
+"""
+CacheDirectory = os.path.join(ApplicationDirectory, "cache")
+
+"""
+Whether to play speech in the GUI from one file growing as chunks arrive,
+streamed to the player over local HTTP, instead of chunk by chunk.
+"""
+ProgressivePlayback = True
+
+"""
+Maximum number of texts kept in the GUI history, 0 for unlimited: least
+recently used texts beyond that are dropped, together with their audio files.
+"""
+HistoryLimit = 100
+
+"""
+File to append timings and counters of each conversion to, as JSON lines,
+empty to disable.
+"""
+MetricsLog = ""
+
+"""Default host and port for the HTTP speech service."""
+ServerHost = "127.0.0.1"
+ServerPort = 8080
+
+"""Maximum size of text accepted by the HTTP speech service, in bytes."""
+ServerMaxTextSize = 1024 * 1024
+
+"""Maximum size of the audio chunk cache in bytes, 0 disables caching."""
+CacheSizeLimit = 50 * 1024 * 1024
 
 """
 Marker in entered text to insert a silence break, chopping up the sentence
@@ -0,0 +1,359 @@
+#-*- coding: utf-8 -*-
+"""
+HTTP service for TextSpeak: converts POSTed text to speech MP3, streaming
+audio back with chunked transfer encoding as soon as chunks are synthesized,
+with one chunk cache shared by all requests.
+
+  POST /speech?lang=en   text as request body (charset from Content-Type,
+                         UTF-8 by default), or as form fields "text" and
+                         "lang"; responds with audio/mpeg
+  GET  /health           service status and metrics as JSON
+
+Started from the command line, e.g. python speech.py --serve 8080
+
+Also provides a local server streaming files while they are being written,
+for progressive playback in the GUI.
+
+------------------------------------------------------------------------------
+This file is part of TextSpeak - a simple text-to-speech program.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+"""
+import BaseHTTPServer
+import cgi
+import codecs
+import itertools
+import json
+import os
+import socket
+import SocketServer
+import threading
+import time
+import urllib
+import urlparse
+
+import conf
+import speech
+
+
+class SpeechServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP server converting text to speech, all requests sharing
+    one speech loader and its chunk cache.
+    """
+    daemon_threads = True # Daemon threads do not keep program running
+    allow_reuse_address = True
+
+
+    def __init__(self, address, loader=None):
+        """
+        @param   address  (host, port) to listen on
+        @param   loader   SpeechLoader to use, by default speech.make_loader()
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, address, SpeechHandler)
+        self.loader = loader or speech.make_loader()
+        self.started = time.time()
+        self.stats = dict((x, 0) for x in ["requests", "active", "completed",
+                          "failed", "cancelled", "chunks", "bytes"])
+        self.lock = threading.Lock()
+
+
+    def count(self, **kwargs):
+        """Adds given values to server statistics."""
+        with self.lock:
+            for k, v in kwargs.items():
+                self.stats[k] += v
+
+
+    def get_stats(self):
+        """
+        Returns service status and metrics: request counts, audio chunks
+        and bytes streamed, chunk cache and fetch statistics.
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        breaker = self.loader.breaker
+        return {"status": "ok" if breaker.opened is None else "degraded",
+                "version": conf.Version, "backend": self.loader.backend.name,
+                "uptime": round(time.time() - self.started, 3),
+                "speech": stats, "cache": self.loader.cache.get_stats(),
+                "fetch": self.loader.get_stats()}
+
+
+
+class SpeechHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Request handler for SpeechServer."""
+    protocol_version = "HTTP/1.1"
+    server_version = "%s/%s" % (conf.Title, conf.Version)
+
+
+    def do_GET(self):
+        if "/health" == urlparse.urlsplit(self.path).path:
+            self.send_content(200, json.dumps(self.server.get_stats(),
+                              indent=2, sort_keys=True), "application/json")
+        else:
+            self.send_content(404, "Not found.")
+
+
+    def do_POST(self):
+        parts = urlparse.urlsplit(self.path)
+        if "/speech" != parts.path:
+            return self.send_content(404, "Not found.")
+        self.server.count(requests=1)
+        ctype, params = cgi.parse_header(self.headers.get("Content-Type", ""))
+        length = self.headers.get("Content-Length", "")
+        if not length.isdigit() or int(length) > conf.ServerMaxTextSize:
+            self.close_connection = 1 # Request body left unread
+            if not length.isdigit():
+                return self.send_content(411, "Content-Length required.")
+            return self.send_content(413, "Text too large, maximum is %s "
+                                     "bytes." % conf.ServerMaxTextSize)
+        body = BodyReader(self.rfile, int(length))
+        args = dict(urlparse.parse_qsl(parts.query))
+        try:
+            if "application/x-www-form-urlencoded" == ctype:
+                args.update(urlparse.parse_qsl(body.read()))
+                text = args.get("text", "").decode("utf-8")
+            else: # Plain text body, read while synthesizing
+                text = codecs.getreader(params.get("charset", "utf-8"))(body)
+        except (LookupError, UnicodeError) as e:
+            body.skip()
+            return self.send_content(400, "Invalid text encoding: %s" % e)
+        lang = args.get("lang", "en")
+        if lang not in [x[0] for x in conf.Languages]:
+            body.skip()
+            return self.send_content(400, "Unknown language %r." % lang)
+        self.send_speech(text, lang, body)
+
+
+    def send_speech(self, text, lang, body):
+        """
+        Streams speech MP3 for text in chunked transfer encoding, as chunks
+        are synthesized. Cancels synthesis if the client disconnects.
+        """
+        loader = self.server.loader
+        job = loader.make_job(speech.PRIORITY_INTERACTIVE)
+        results, writer = loader.load(text, lang, job), None
+        self.server.count(active=1)
+        try:
+            try:
+                first = next(results, None)
+            except Exception as e: # Like invalid characters in text
+                self.server.count(failed=1)
+                body.skip()
+                return self.send_content(400, "Error reading text: %s" % e)
+            if first is None:
+                self.server.count(failed=1)
+                return self.send_content(400, "No text to speak.")
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            stream = ChunkedWriter(self.wfile)
+            writer = speech.SpeechWriter(stream, job["timings"])
+            try:
+                for i, chunk, content, count in itertools.chain([first],
+                                                                results):
+                    writer.write(chunk, content)
+                    stream.flush()
+                    self.server.count(chunks=1)
+                self.server.count(completed=1)
+            except speech.SpeechError as e: # Failed chunks sent as silence
+                self.server.count(failed=1)
+                self.log_error("%s", str(e).split("\n")[0])
+            stream.close()
+            self.server.count(bytes=writer.position)
+        except socket.error: # Client went away
+            loader.cancel(job)
+            self.server.count(cancelled=1)
+            self.close_connection = 1
+        finally:
+            self.server.count(active=-1)
+            results.close()
+            speech.log_metrics(job["timings"], mode="service", lang=lang,
+                               client=self.client_address[0],
+                               chunks=len(writer.offsets) if writer else 0,
+                               size=writer.position if writer else 0)
+
+
+    def handle(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
+        except socket.error:
+            self.close_connection = 1 # Client went away
+
+
+    def finish(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+        except socket.error:
+            pass # Client went away
+
+
+    def send_content(self, status, content, content_type="text/plain"):
+        """Sends a complete response."""
+        if isinstance(content, unicode):
+            content = content.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "%s; charset=utf-8" % content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+
+class BodyReader(object):
+    """File-like reader of a request body of known length."""
+
+    def __init__(self, stream, length):
+        self.stream, self.left = stream, length
+
+
+    def read(self, size=-1):
+        size = self.left if size < 0 else min(size, self.left)
+        data = self.stream.read(size) if size else ""
+        self.left -= len(data)
+        return data
+
+
+    def readline(self, size=-1):
+        size = self.left if size < 0 else min(size, self.left)
+        data = self.stream.readline(size) if size else ""
+        self.left -= len(data)
+        return data
+
+
+    def skip(self):
+        """Reads and discards the rest of the body."""
+        while self.read(speech.COPY_BUFFER_SIZE):
+            pass
+
+
+
+class ChunkedWriter(object):
+    """File-like writer of HTTP chunked transfer encoding."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+
+    def write(self, data):
+        if data:
+            self.stream.write("%x\r\n%s\r\n" % (len(data), data))
+
+
+    def flush(self):
+        self.stream.flush()
+
+
+    def close(self):
+        """Writes the terminating chunk."""
+        self.stream.write("0\r\n\r\n")
+        self.stream.flush()
+
+
+
+class StreamServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Local HTTP server streaming files while they are being written, for
+    progressive playback: a media player can start reading at once, and
+    keeps receiving data until the file is marked finished. Runs in a
+    background thread.
+    """
+    daemon_threads = True # Daemon threads do not keep program running
+    POLL_INTERVAL = 0.05 # Seconds to wait for more data in a growing file
+
+
+    def __init__(self, host="127.0.0.1"):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, 0), StreamHandler)
+        self.streams = {} # {URL path: stream}
+        self.ids = itertools.count(1)
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+    def add(self, filename):
+        """
+        Registers a file being written, returns stream as {"url", "path",
+        "filename", "finished": threading.Event to set when file is complete}.
+        """
+        path = "/%s/%s" % (next(self.ids),
+                           urllib.quote(os.path.basename(filename)))
+        url = "http://%s:%s%s" % (self.server_address + (path, ))
+        stream = {"url": url, "path": path, "filename": filename,
+                  "finished": threading.Event()}
+        self.streams[path] = stream
+        return stream
+
+
+    def remove(self, path):
+        """
+        Unregisters the stream at URL path, if any, ending ongoing responses
+        at the current end of file.
+        """
+        stream = self.streams.pop(path, None)
+        if stream:
+            stream["finished"].set()
+
+
+
+class StreamHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Request handler for StreamServer, sending file contents as they grow,
+    until the end of a finished file. Response is delimited by closing
+    connection, as the final length is not known in advance.
+    """
+
+    def do_GET(self):
+        stream = self.server.streams.get(urlparse.urlsplit(self.path).path)
+        if not stream:
+            return self.send_error(404)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.end_headers()
+        try:
+            with open(stream["filename"], "rb") as f:
+                while True:
+                    finished = stream["finished"].is_set()
+                    data = f.read(speech.COPY_BUFFER_SIZE)
+                    if data:
+                        self.wfile.write(data)
+                    elif finished:
+                        break # while True
+                    else:
+                        stream["finished"].wait(self.server.POLL_INTERVAL)
+        except (IOError, socket.error):
+            pass # File removed or player went away
+
+
+    def log_message(self, format, *args):
+        pass # Keep console clean
+
+
+
+def serve(address=None, backend=None, out=None):
+    """
+    Runs the speech service until interrupted.
+
+    @param   address  "[host:]port" to listen on,
+                      by default conf.ServerHost and conf.ServerPort
+    @param   backend  Backend name, by default conf.Backend
+    @param   out      file-like to write status messages to, if any
+    """
+    host, _, port = (address or "").rpartition(":")
+    host, port = host or conf.ServerHost, int(port or conf.ServerPort)
+    server = SpeechServer((host, port), speech.make_loader(backend))
+    if out:
+        out.write("%s speech service listening on http://%s:%s, using %s.\n"
+                  % (conf.Title, host, server.server_address[1],
+                     server.loader.backend.title))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
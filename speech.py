@@ -0,0 +1,2097 @@
+#-*- coding: utf-8 -*-
+"""
+Text-to-speech functionality without any GUI dependencies: dividing text into
+chunks, loading chunk audio from the Google Translate text-to-speech online
+service, caching and merging the results into one MP3.
+
+Can also be used from the command line, e.g.
+python speech.py --lang en --output hello.mp3 "Hello world."
+
+------------------------------------------------------------------------------
+This file is part of TextSpeak - a simple text-to-speech program.
+Released under the MIT License.
+
+@author      Erki Suurjaak
+@created     18.10.2026
+@modified    18.10.2026
+"""
+import argparse
+import base64
+import codecs
+import collections
+import contextlib
+import datetime
+import difflib
+import email.utils
+import hashlib
+import httplib
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import urllib
+import urlparse
+try:
+    import fcntl
+except ImportError: # Not available on Windows
+    fcntl = None
+    import msvcrt
+
+import conf
+
+"""Decoded MP3 silence from conf.Silence, for pauses between chunks."""
+SILENCE = base64.decodestring(conf.Silence)
+
+"""MPEG Layer III bitrates in kbps by header index, for MPEG-1 or MPEG-2."""
+MP3_BITRATES = {True:  [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192,
+                        224, 256, 320],
+                False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128,
+                        144, 160]}
+
+"""MPEG sample rates by header version bits, as [rate by header index]."""
+MP3_SAMPLERATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000],
+                   0: [11025, 12000, 8000]}
+
+"""Cached MP3 silence, as {(MP3 format, milliseconds): silent frames}."""
+SILENCE_BLOCKS = {}
+
+"""Interpunctuation marks where text is divided into chunks."""
+PUNCTUATION = frozenset(u",:;.–?!()")
+
+"""Buffer size in bytes for copying audio files."""
+COPY_BUFFER_SIZE = 64 * 1024
+
+"""Speech job priorities, lower is more urgent."""
+PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND = 0, 1, 2
+
+
+class SpeechError(Exception):
+    """Error raised when audio for text chunks could not be retrieved."""
+
+    def __init__(self, message, cause=None, errors=()):
+        """
+        @param   cause   original exception, if any
+        @param   errors  [(index, text chunk, error text), ] for failed chunks,
+                         if the rest of the text was completed
+        """
+        Exception.__init__(self, message)
+        self.cause, self.errors = cause, list(errors)
+
+
+
+class CircuitBreaker(object):
+    """
+    Fails calls fast after a number of consecutive failures, until a
+    cooldown has passed, then lets a single trial call through: closing
+    again on its success, or opening for another cooldown. Thread-safe.
+    """
+
+    def __init__(self, threshold, cooldown):
+        """
+        @param   threshold  consecutive failures to open circuit after
+        @param   cooldown   seconds to keep circuit open
+        """
+        self.threshold, self.cooldown = max(1, threshold), cooldown
+        self.failures = 0
+        self.opened = None # Time when circuit was opened
+        self.trial = False # Whether a trial call is underway
+        self.lock = threading.Lock()
+
+
+    def allow(self):
+        """Returns whether a call can be made."""
+        with self.lock:
+            if self.opened is None:
+                return True
+            if not self.trial and time.time() - self.opened >= self.cooldown:
+                self.trial = True
+                return True
+            return False
+
+
+    def success(self):
+        """Registers a successful call, closing circuit."""
+        with self.lock:
+            self.failures, self.opened, self.trial = 0, None, False
+
+
+    def release(self):
+        """Gives back an allowed trial call that was not made after all."""
+        with self.lock:
+            self.trial = False
+
+
+    def failure(self):
+        """Registers a failed call, opening circuit if threshold reached."""
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened, self.trial = time.time(), False
+
+
+
+class HttpError(Exception):
+    """Error raised on an HTTP response with unsuccessful status."""
+
+    def __init__(self, url, status, reason, headers):
+        """
+        @param   headers  response headers, as {lowercase name: value}
+        """
+        Exception.__init__(self, "HTTP Error %s: %s" % (status, reason))
+        self.url, self.status, self.reason = url, status, reason
+        self.headers = headers
+
+
+
+class HttpPool(object):
+    """
+    Pool of persistent HTTP connections, reused with keep-alive for requests
+    to the same host, with timeouts on connecting and reading. Thread-safe.
+    """
+    MAX_REDIRECTS = 5
+
+
+    def __init__(self, headers=None, maxsize=None,
+                 connect_timeout=None, read_timeout=None):
+        """
+        @param   headers          default request headers, as {name: value}
+        @param   maxsize          maximum number of idle connections per host,
+                                  by default conf.FetchWorkersPerHost
+        @param   connect_timeout  seconds, by default conf.HttpConnectTimeout
+        @param   read_timeout     seconds, by default conf.HttpReadTimeout
+        """
+        self.headers = dict(headers or {})
+        self.maxsize = maxsize or max(1, conf.FetchWorkersPerHost)
+        self.connect_timeout = connect_timeout or conf.HttpConnectTimeout
+        self.read_timeout = read_timeout or conf.HttpReadTimeout
+        self.idle = collections.defaultdict(list) # {(scheme, host, port): []}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "connects": 0, "reuses": 0, "errors": 0}
+
+
+    def request(self, url, method="GET", body=None, headers=None):
+        """
+        Returns response content for URL, following redirects.
+
+        @throws  HttpError  on unsuccessful response status
+        @throws  socket.error, httplib.HTTPException  on connection failure
+        """
+        for i in range(self.MAX_REDIRECTS + 1):
+            status, reason, response_headers, content = \
+                self.open(url, method, body, headers)
+            if status in (301, 302, 303, 307, 308) \
+            and "location" in response_headers:
+                url = urlparse.urljoin(url, response_headers["location"])
+                if 303 == status:
+                    method, body = "GET", None
+                continue # for i
+            if not 200 <= status < 300:
+                raise HttpError(url, status, reason, response_headers)
+            return content
+        raise HttpError(url, status, "Too many redirects", response_headers)
+
+
+    def open(self, url, method="GET", body=None, headers=None):
+        """
+        Makes a single request on a pooled connection, retrying once on a
+        fresh connection if a reused one had gone stale.
+
+        @return  (status, reason, {lowercase header name: value}, content)
+        """
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or "/") + ("?%s" % parts.query if parts.query else "")
+        headers = dict(self.headers, **headers or {})
+        connection = self.acquire(key)
+        reused = connection is not None
+        with self.lock:
+            self.stats["requests"] += 1
+        while True:
+            try:
+                if not connection:
+                    connection = self.connect(key)
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                content = response.read()
+                break # while True
+            except (httplib.HTTPException, socket.error):
+                if connection:
+                    connection.close()
+                if reused: # Server may have closed idle keep-alive
+                    connection, reused = None, False
+                    continue # while True
+                with self.lock:
+                    self.stats["errors"] += 1
+                raise
+        if response.will_close:
+            connection.close()
+        else:
+            self.release(key, connection)
+        return (response.status, response.reason,
+                dict(response.getheaders()), content)
+
+
+    def connect(self, key):
+        """Returns a new connection for (scheme, host, port)."""
+        scheme, host, port = key
+        cls = httplib.HTTPSConnection if "https" == scheme \
+              else httplib.HTTPConnection
+        connection = cls(host, port, timeout=self.connect_timeout)
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+        with self.lock:
+            self.stats["connects"] += 1
+        return connection
+
+
+    def acquire(self, key):
+        """Returns an idle connection for (scheme, host, port), or None."""
+        with self.lock:
+            if self.idle[key]:
+                self.stats["reuses"] += 1
+                return self.idle[key].pop()
+
+
+    def release(self, key, connection):
+        """Returns connection to pool, closing it if pool is full."""
+        with self.lock:
+            if len(self.idle[key]) < self.maxsize:
+                self.idle[key].append(connection)
+                connection = None
+        if connection:
+            connection.close()
+
+
+    def close(self):
+        """Closes all idle connections."""
+        with self.lock:
+            connections = sum(self.idle.values(), [])
+            self.idle.clear()
+        for connection in connections:
+            connection.close()
+
+
+    def get_stats(self):
+        """
+        Returns a dictionary of pool statistics: requests, connects, reuses,
+        errors, and idle connections.
+        """
+        with self.lock:
+            return dict(self.stats, idle=sum(map(len, self.idle.values())))
+
+
+
+class RateLimiter(object):
+    """
+    Limits request rate with a token bucket and concurrent requests with
+    slots, shared by all threads and all local processes via lock files
+    in a common directory. Use as context manager around each request.
+    """
+    SLOT_POLL_INTERVAL = 0.05 # Seconds between checks for a free slot
+
+
+    def __init__(self, name, rate=None, burst=None, concurrency=None,
+                 path=None):
+        """
+        @param   name         name of the limited resource, like backend name
+        @param   rate         requests per second, by default conf.RateLimit,
+                              0 for unlimited
+        @param   burst        maximum requests at once when rate allows,
+                              by default conf.RateLimitBurst
+        @param   concurrency  maximum concurrent requests, by default
+                              conf.RateLimitConcurrency, 0 for unlimited
+        @param   path         directory for shared state,
+                              by default conf.RateLimitDirectory
+        """
+        self.name = name
+        self.rate = conf.RateLimit if rate is None else rate
+        self.burst = max(1, conf.RateLimitBurst if burst is None else burst)
+        self.concurrency = conf.RateLimitConcurrency if concurrency is None \
+                           else concurrency
+        self.path = path or conf.RateLimitDirectory
+        self.lock = threading.Lock()
+        self.local = threading.local() # Holds slot file of current thread
+        self.bucket = None # Shared state file, "tokens timestamp paused_until"
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            filename = os.path.join(self.path, "%s.bucket" % name)
+            self.bucket = os.fdopen(os.open(filename, os.O_RDWR | os.O_CREAT),
+                                    "r+b")
+        except Exception:
+            self.concurrency = 0 # Directory unusable: no sharing limits
+
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+
+
+    def acquire(self):
+        """Blocks until a concurrency slot and a rate token are available."""
+        self.local.slot = self.acquire_slot()
+        try:
+            while True:
+                wait = self.update_bucket(take=True)
+                if not wait:
+                    break # while True
+                time.sleep(wait)
+        except Exception:
+            self.release()
+            raise
+
+
+    def release(self):
+        """Releases the concurrency slot held by current thread, if any."""
+        slot, self.local.slot = getattr(self.local, "slot", None), None
+        if slot:
+            unlock_file(slot)
+            slot.close()
+
+
+    def pause(self, seconds):
+        """Holds off all requests for given seconds, like on rate limiting."""
+        self.update_bucket(pause=seconds)
+
+
+    def acquire_slot(self):
+        """Returns a locked slot file, waiting until one is free, or None."""
+        while self.concurrency > 0:
+            for i in range(self.concurrency):
+                filename = os.path.join(self.path, "%s.slot%s" % (self.name, i))
+                f = open(filename, "ab")
+                if lock_file(f, blocking=False):
+                    return f
+                f.close()
+            time.sleep(self.SLOT_POLL_INTERVAL)
+
+
+    def update_bucket(self, take=False, pause=0):
+        """
+        Refills shared token bucket, optionally taking a token or pausing.
+        With unlimited rate, taking only reads the shared pause, without
+        locking or rewriting the bucket file.
+
+        @return  seconds to wait before a token can be taken, 0 if taken
+        """
+        if not self.bucket or (self.rate <= 0 and not take and not pause):
+            return 0
+        if self.rate <= 0 and not pause: # Unlimited rate: check pause only
+            with self.lock:
+                self.bucket.seek(0)
+                values = self.bucket.read().split()
+            try:
+                until = float(values[2])
+            except (IndexError, ValueError):
+                until = 0
+            return max(0, until - time.time())
+        wait = 0
+        with self.lock:
+            lock_file(self.bucket)
+            try:
+                self.bucket.seek(0)
+                now, values = time.time(), self.bucket.read().split()
+                try:
+                    tokens, stamp, until = map(float, values)
+                except ValueError:
+                    tokens, stamp, until = self.burst, now, 0
+                if self.rate > 0:
+                    tokens = min(self.burst,
+                                 tokens + max(0, now - stamp) * self.rate)
+                until = max(until, now + pause)
+                if take:
+                    if until > now:
+                        wait = until - now
+                    elif self.rate <= 0:
+                        pass # Unlimited rate
+                    elif tokens >= 1:
+                        tokens -= 1
+                    else:
+                        wait = (1 - tokens) / self.rate
+                self.bucket.seek(0)
+                self.bucket.truncate()
+                self.bucket.write("%r %r %r" % (tokens, now, until))
+                self.bucket.flush()
+            finally:
+                unlock_file(self.bucket)
+        return wait
+
+
+
+class Backend(object):
+    """
+    Base class for text-to-speech engines. Subclasses declare the maximum
+    text chunk length, output audio format and concurrency limit, and
+    implement synthesize().
+    """
+
+    """Backend name, as used in conf.Backend."""
+    name = None
+
+    """Human-readable backend title."""
+    title = None
+
+    """Maximum length of a text chunk, in characters."""
+    max_length = 100
+
+    """Format of produced audio, must concatenate like MP3."""
+    format = "mp3"
+
+    """Maximum number of concurrent synthesize() calls."""
+    concurrency = 1
+
+
+    def synthesize(self, text, lang):
+        """
+        Returns speech audio for the text.
+
+        @param   text  text chunk to speak, as UTF-8 string
+        @param   lang  language code, like "en"
+        @throws  SpeechError  on failure
+        """
+        raise NotImplementedError
+
+
+    def get_url(self, text, lang):
+        """
+        Returns the URL to download speech audio for the text from, if the
+        backend is an online service answering plain HTTP GET, else None.
+        """
+        return None
+
+
+    def get_stats(self):
+        """Returns a dictionary of backend statistics, if any."""
+        return {}
+
+
+
+class GoogleBackend(Backend):
+    """Speech from the Google Translate text-to-speech online service."""
+    name, title = "google", "Google Translate online service"
+    max_length = 100
+    URL = "http://translate.google.com/translate_tts?tl=%s&q=%s"
+    HEADERS = {"User-Agent": "Mozilla/4.0 (compatible; MSIE 6.0; "
+                             "Windows NT 5.0) %s" % conf.Title}
+
+
+    def __init__(self):
+        self.concurrency = max(1, conf.FetchWorkersPerHost)
+        self.pool = HttpPool(self.HEADERS, self.concurrency)
+
+
+    def synthesize(self, text, lang):
+        """Returns MP3 audio downloaded from Google Translate."""
+        url = self.get_url(text, lang)
+        try:
+            return self.pool.request(url)
+        except Exception as e:
+            raise SpeechError("Error accessing the Google Translate online "
+                              "service.\n\nURL: %s\n\n%s" % (
+                              url.replace("?", "?\n"), traceback.format_exc()),
+                              cause=e)
+
+
+    def get_url(self, text, lang):
+        """Returns Google Translate URL for the text."""
+        return self.URL % (lang, urllib.quote(text))
+
+
+    def get_stats(self):
+        """Returns HTTP connection pool statistics."""
+        return self.pool.get_stats()
+
+
+
+class EspeakBackend(Backend):
+    """
+    Offline speech from the eSpeak speech synthesizer, encoded to MP3 with
+    LAME. Requires espeak and lame executables in path.
+    """
+    name, title = "espeak", "eSpeak offline synthesizer"
+    max_length = 1000
+    COMMANDS = [["espeak", "-v", "%(lang)s", "--stdin", "--stdout"],
+                ["lame", "--quiet", "-b", "32", "--resample", "16",
+                 "-m", "m", "-", "-"]] # Match bitrate of conf.Silence
+
+
+    def __init__(self):
+        self.concurrency = multiprocessing.cpu_count()
+
+
+    def synthesize(self, text, lang):
+        """Returns MP3 audio from piping espeak output to lame."""
+        args = dict(lang=lang.split("-")[0].lower())
+        cmd1, cmd2 = [[x % args for x in c] for c in self.COMMANDS]
+        try:
+            espeak = subprocess.Popen(cmd1, stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            lame = subprocess.Popen(cmd2, stdin=espeak.stdout,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            espeak.stdout.close() # Let lame receive SIGPIPE if espeak exits
+            espeak.stdin.write(text)
+            espeak.stdin.close()
+            content, error = lame.communicate()
+            error = (espeak.stderr.read() + error).strip()
+            if espeak.wait() or lame.returncode or not content:
+                raise Exception(error or "No audio produced.")
+        except Exception:
+            raise SpeechError("Error running the eSpeak synthesizer.\n\n"
+                              "Command: %s | %s\n\n%s" % (" ".join(cmd1),
+                              " ".join(cmd2), traceback.format_exc()))
+        return content
+
+
+
+class FakeBackend(Backend):
+    """
+    Deterministic offline stand-in producing silent MP3 of a duration
+    proportional to text length, for testing and benchmarking the pipeline.
+    """
+    name, title = "fake", "silent offline stand-in"
+    max_length = 100
+    CHARS_PER_SILENCE = 4 # Text characters per one conf.Silence span
+
+
+    def __init__(self):
+        self.concurrency = max(1, conf.FetchWorkers)
+
+
+    def synthesize(self, text, lang):
+        """Returns silent MP3 for the text."""
+        return SILENCE * max(1, len(text.decode("utf-8")) //
+                                self.CHARS_PER_SILENCE)
+
+
+
+"""Available text-to-speech backends, as {name: Backend class}."""
+BACKENDS = collections.OrderedDict((x.name, x) for x in
+                                   [GoogleBackend, EspeakBackend, FakeBackend])
+
+
+def make_backend(name=None):
+    """Returns a new backend instance by name, by default conf.Backend."""
+    name = name or conf.Backend
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend %r, expected one of: %s." %
+                         (name, ", ".join(BACKENDS)))
+    return BACKENDS[name]()
+
+
+def make_loader(backend=None, engine=None):
+    """
+    Returns a new speech loader for the backend, using the fetch engine
+    by name, by default conf.FetchEngine: "threads" for SpeechLoader, or
+    "async" for AsyncSpeechLoader if the backend is a plain HTTP service.
+
+    @param   backend  Backend instance or name, by default conf.Backend
+    """
+    if not isinstance(backend, Backend):
+        backend = make_backend(backend)
+    if "async" == (engine or conf.FetchEngine) \
+    and (backend.get_url("", "en") or "").startswith("http://"):
+        import asyncloader # Imported here as it builds on this module
+        return asyncloader.AsyncSpeechLoader(backend)
+    return SpeechLoader(backend)
+
+
+
+class FetchScheduler(object):
+    """
+    Queue of chunk fetch tasks grouped by job, handing out tasks from the
+    most urgent job first: by job priority, then by job age. Priorities can
+    change while tasks are queued, tasks of stopped jobs are dropped.
+    """
+
+    def __init__(self):
+        self.jobs = [] # Jobs with queued tasks
+        self.ids = set() # IDs of jobs in self.jobs
+        self.condition = threading.Condition()
+
+
+    def put(self, job, task):
+        """Queues a task for the job."""
+        with self.condition:
+            if job["id"] not in self.ids: # Tasks emptied, job still listed
+                self.ids.add(job["id"])
+                self.jobs.append(job)
+            job["tasks"].append(task)
+            self.condition.notify()
+
+
+    def get(self, block=True):
+        """
+        Returns (job, task) for the most urgent job, waiting for any if
+        blocking, else returning None if nothing queued.
+        """
+        with self.condition:
+            while True:
+                self.jobs = [x for x in self.jobs
+                             if x["tasks"] and not x["stopped"]]
+                self.ids = set(x["id"] for x in self.jobs)
+                if self.jobs or not block:
+                    break # while True
+                self.condition.wait()
+            if not self.jobs:
+                return None
+            job = min(self.jobs, key=lambda x: (x["priority"], x["id"]))
+            return job, job["tasks"].popleft()
+
+
+    def set_priority(self, job, priority):
+        """Changes job priority, taking effect from the next task handed out."""
+        with self.condition:
+            job["priority"] = priority
+
+
+    def cancel(self, job):
+        """Stops the job, dropping its queued tasks."""
+        with self.condition:
+            job["stopped"] = True
+            job["tasks"].clear()
+
+
+
+class Timings(object):
+    """
+    Thread-safe collector of timings and counters for one conversion:
+    number of calls, total and maximum seconds for each timed stage, like
+    parsing, fetching and writing, and counts of events like cache hits.
+    Timings of parallel stages add up, so totals can exceed elapsed time.
+    """
+
+    def __init__(self):
+        self.started = self.last = time.time()
+        self.timers = collections.OrderedDict() # {name: [calls, total, max]}
+        self.counters = collections.OrderedDict() # {name: count}
+        self.lock = threading.Lock()
+
+
+    def add(self, name, seconds):
+        """Adds a call of given duration to the named timer."""
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0., 0.])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+
+    def lap(self, name):
+        """Adds time since the previous lap, or since start, to named timer."""
+        now = time.time()
+        self.add(name, now - self.last)
+        self.last = now
+
+
+    def count(self, name, value=1):
+        """Adds value to the named counter."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Context manager timing its block into the named timer."""
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - started)
+
+
+    def get_stats(self):
+        """
+        Returns timings as {"elapsed": seconds since start, "timers": {name:
+        {"calls", "total", "max"}}, "counters": {name: count}}.
+        """
+        with self.lock:
+            timers = [(k, dict(zip(["calls", "total", "max"], v)))
+                      for k, v in self.timers.items()]
+            return {"elapsed": time.time() - self.started,
+                    "timers": collections.OrderedDict(timers),
+                    "counters": collections.OrderedDict(self.counters)}
+
+
+    def get_report(self):
+        """Returns timings as a human-readable text table."""
+        stats = self.get_stats()
+        width = max([8] + [len(x) for x in stats["timers"]])
+        lines = ["Elapsed %.3f seconds." % stats["elapsed"],
+                 "%-*s %7s %10s %10s %10s" % (width, "stage", "calls",
+                                              "total s", "avg ms", "max ms")]
+        for name, x in stats["timers"].items():
+            lines.append("%-*s %7s %10.3f %10.1f %10.1f" % (width, name,
+                         x["calls"], x["total"],
+                         1000 * x["total"] / x["calls"], 1000 * x["max"]))
+        counters = stats["counters"]
+        lookups = counters.get("cache hits", 0) + \
+                  counters.get("cache misses", 0)
+        if lookups:
+            counters["cache hit %"] = "%.1f" % (100. *
+                                      counters.get("cache hits", 0) / lookups)
+        if counters:
+            lines.append(", ".join("%s: %s" % x for x in counters.items()))
+        return "\n".join(lines)
+
+
+
+class SpeechLoader(object):
+    """
+    Loads speech audio for texts from a text-to-speech backend, as smaller
+    MP3 chunks. Chunks are synthesized by a pool of worker threads in
+    parallel, results are yielded in chunk order. Workers take chunks from
+    the most urgent job first, so background work yields to interactive
+    requests between chunks. Identical chunks are synthesized only once
+    at a time, audio going to every job and position waiting for it.
+    """
+    EDIT_MAX_CHUNKS = 5000 # Most chunks in texts compared by load_edit()
+    REUSE_MAX_SIZE = 4 * 1024 * 1024 # Most bytes kept for repeats in a text
+
+
+    def __init__(self, backend=None):
+        """
+        @param   backend  Backend instance or name, by default conf.Backend
+        """
+        if not isinstance(backend, Backend):
+            backend = make_backend(backend)
+        self.backend = backend
+        self.scheduler = FetchScheduler() # Tasks of (lang, text)
+        self.fetches = {} # {(lang, text): {"waiters": [(job, index)], ..}}
+        self.lock = threading.Lock() # Guards fetches
+        self.job_ids = itertools.count()
+        self.semaphore = threading.BoundedSemaphore(backend.concurrency)
+        self.breaker = CircuitBreaker(conf.CircuitBreakerThreshold,
+                                      conf.CircuitBreakerCooldown)
+        self.limiter = RateLimiter(backend.name)
+        self.cache = ChunkCache(conf.CacheDirectory, conf.CacheSizeLimit,
+                                backend.name)
+        self.window = 2 * max(1, conf.FetchWorkers) # Chunks to queue ahead
+        self.start_workers()
+
+
+    def start_workers(self):
+        """Starts the fetch worker threads."""
+        for i in range(max(1, conf.FetchWorkers)):
+            worker = threading.Thread(target=self.fetch_worker)
+            worker.daemon = True # Daemon threads do not keep program running
+            worker.start()
+
+
+    def load(self, text, lang, job=None):
+        """
+        Generates speech audio for the text, yielding (index, text chunk,
+        content, total count or None if text not fully parsed yet) for each
+        text chunk in order. Text is parsed lazily, synthesis starts at once.
+
+        @param   text  text to speak, as Unicode or UTF-8 string,
+                       or a file-like object to read UTF-8 text from
+        @param   lang  language code, like "en"
+        @param   job   job from make_job(), for changing priority or
+                       cancelling while loading
+        @throws  SpeechError  if synthesizing a chunk failed
+        """
+        if isinstance(text, unicode):
+            text = text.encode("utf-8")
+        return self.load_chunks(self.iter_text(text), lang, job)
+
+
+    def make_job(self, priority=PRIORITY_NORMAL):
+        """Returns a new job for load(), with given priority."""
+        return {"id": next(self.job_ids), "priority": priority,
+                "stopped": False, "tasks": collections.deque(),
+                "results": {}, "condition": threading.Condition(),
+                "timings": Timings()}
+
+
+    def set_priority(self, job, priority):
+        """Changes the priority of a job, queued chunks included."""
+        self.scheduler.set_priority(job, priority)
+
+
+    def cancel(self, job):
+        """
+        Cancels a job: queued chunks are dropped, retries of chunks being
+        synthesized are skipped, and loading ends without further results.
+        """
+        self.scheduler.cancel(job)
+        with self.lock: # Drop queued chunks no other job is waiting for
+            for key, fetch in self.fetches.items():
+                if not fetch["started"] and self.is_abandoned(fetch):
+                    del self.fetches[key]
+        with job["condition"]:
+            job["condition"].notify_all()
+
+
+    def queue(self, job, index, lang, text):
+        """
+        Queues a text chunk for synthesis, unless the same chunk is already
+        queued or being synthesized for any job, sharing its audio then.
+        Chunk is queued under each job waiting for it, so that the most
+        urgent job gets it started, and cancelling one does not hold up
+        the others.
+        """
+        key = (lang, text)
+        with self.lock:
+            fetch = self.fetches.setdefault(key, {"waiters": [],
+                                                  "started": False})
+            fetch["waiters"].append((job, index))
+            if len(fetch["waiters"]) > 1:
+                job["timings"].count("shared chunks")
+        self.scheduler.put(job, key)
+
+
+    def next_task(self, block=True):
+        """
+        Returns (job, (lang, text)) of the next chunk to synthesize, skipping
+        chunks already started for another job, waiting for any if blocking,
+        else returning None if nothing queued.
+        """
+        while True:
+            item = self.scheduler.get(block)
+            if item is None:
+                return None
+            with self.lock:
+                fetch = self.fetches.get(item[1])
+                if fetch and not fetch["started"]:
+                    fetch["started"] = True
+                    return item
+
+
+    def is_stopped(self, key):
+        """Returns whether all jobs waiting for (lang, text) chunk stopped."""
+        with self.lock:
+            return self.is_abandoned(self.fetches.get(key))
+
+
+    def is_abandoned(self, fetch):
+        """Returns whether all jobs waiting for the fetch stopped."""
+        return not fetch or all(x["stopped"] for x, _ in fetch["waiters"])
+
+
+    def deliver(self, key, content, error):
+        """
+        Stores chunk (content, error) into the results of every job waiting
+        for the (lang, text) chunk, and content into the chunk cache.
+        """
+        if content is not None:
+            self.cache.put(key[0], key[1], content)
+        with self.lock:
+            fetch = self.fetches.pop(key)
+        for job, index in fetch["waiters"]:
+            with job["condition"]:
+                job["results"][index] = (content, error)
+                job["condition"].notify_all()
+
+
+    def parse_text(self, text):
+        """Returns text divided into chunks suitable for the backend."""
+        return parse_text(text, self.backend.max_length)
+
+
+    def iter_text(self, text):
+        """Yields text chunks suitable for the backend, as found."""
+        return iter_text(text, self.backend.max_length)
+
+
+    def load_chunks(self, text_chunks, lang, job=None):
+        """
+        Generates speech audio for text chunks, yielding (index, text chunk,
+        content, total count or None if not known yet) for each chunk in
+        order. Chunks are taken from the iterable only a window ahead of
+        the chunk being yielded, total count is known by the last chunk.
+        If given a list of chunks, audio of repeated chunks is kept until
+        their last occurrence, each fetched once for the whole text.
+        Otherwise audio of chunks yielded is kept for repeats further on,
+        oldest dropped beyond REUSE_MAX_SIZE bytes.
+
+        @param   text_chunks  iterable of UTF-8 strings, as from iter_text()
+        @param   lang         language code, like "en"
+        @param   job          job from make_job(), by default a new job
+                              of normal priority
+        @throws  SpeechError  after the last chunk if synthesizing any chunks
+                              failed, these are yielded as short silence
+        """
+        job = job or self.make_job()
+        timings = job["timings"]
+        chunks, cached, errors = [], {}, [] # [chunk], {index: content}, [..]
+        source, count = iter(text_chunks), None
+        last = None # Last speech audio, pauses are made in its MP3 format
+        repeats = collections.Counter(text_chunks) \
+                  if isinstance(text_chunks, list) else None
+        reused = collections.OrderedDict() # {chunk: content} for repeats
+        reused_size = 0 # Bytes kept in reused, if not given a list
+        try:
+            i = 0
+            while not job["stopped"]:
+                # Queue chunks not in cache up to a window ahead,
+                # to be synthesized in parallel
+                while count is None and len(chunks) <= i + self.window:
+                    with timings.timer("parse"):
+                        sentence = next(source, None)
+                    if sentence is None:
+                        count = len(chunks)
+                        break # while count is None
+                    index = len(chunks)
+                    chunks.append(sentence)
+                    if conf.SilenceMarker in sentence.lower():
+                        continue # while count is None
+                    if sentence in reused:
+                        timings.count("shared chunks")
+                        cached[index] = reused[sentence]
+                        continue # while count is None
+                    with timings.timer("cache"):
+                        content = self.cache.get(lang, sentence)
+                    if content is not None:
+                        timings.count("cache hits")
+                        cached[index] = content
+                    else:
+                        timings.count("cache misses")
+                        self.queue(job, index, lang, sentence)
+                if i >= len(chunks):
+                    break # while not job["stopped"]
+                sentence = chunks[i]
+                if i in cached:
+                    content = last = cached.pop(i)
+                elif conf.SilenceMarker in sentence.lower():
+                    silence_count = sentence.lower().count(conf.SilenceMarker)
+                    content = make_silence(silence_count * conf.PauseMarker,
+                                           last)
+                else:
+                    with job["condition"], timings.timer("wait"):
+                        while i not in job["results"] and not job["stopped"]:
+                            job["condition"].wait()
+                    if i not in job["results"]:
+                        break # while not job["stopped"]; cancelled
+                    content, error = job["results"].pop(i)
+                    if content is None: # Carry on with the other chunks
+                        errors.append((i, sentence, error))
+                        content = make_silence(conf.PauseMarker, last)
+                    else:
+                        last = content
+                if repeats and content is last: # Keep for next occurrence
+                    repeats[sentence] -= 1
+                    if repeats[sentence]:
+                        reused[sentence] = content
+                    else:
+                        reused.pop(sentence, None)
+                elif repeats is None and content is last \
+                and sentence not in reused: # Keep in case text repeats it
+                    reused[sentence] = content
+                    reused_size += len(content)
+                    while reused_size > self.REUSE_MAX_SIZE:
+                        reused_size -= len(reused.popitem(last=False)[1])
+                yield i, sentence, content, count
+                i += 1
+            if errors and not job["stopped"]:
+                lines = ["%s. %s" % (j + 1, x) for j, x, _ in errors[:10]]
+                lines += ["..."] if len(errors) > len(lines) else []
+                raise SpeechError("Failed to get speech for %s of %s text "
+                    "chunks, replaced with silence:\n\n%s\n\n%s" % (
+                    len(errors), count, "\n".join(lines), errors[0][2]),
+                    errors=errors)
+        finally:
+            self.cancel(job) # Skip any remaining chunks
+
+
+    def load_edit(self, text_chunks, lang, previous, job=None):
+        """
+        Generates speech audio for an edited version of a text, like
+        load_chunks(), synthesizing only chunks changed from the previous
+        version, and taking audio of unchanged chunks from its MP3 file.
+
+        @param   text_chunks  list of text chunks, as from parse_text()
+        @param   lang         language code, like "en"
+        @param   previous     previous version of the text, as
+                              {"chunks": [text chunk, ], "filename": MP3 file,
+                               "offsets": [(audio offset, audio length), ]}
+                              with offsets as recorded by SpeechWriter
+        @param   job          job from make_job(), by default a new job
+                              of normal priority
+        @throws  SpeechError  after the last chunk if synthesizing any chunks
+                              failed, these are yielded as short silence
+        """
+        job = job or self.make_job()
+        if max(len(previous["chunks"]), len(text_chunks)) \
+        > self.EDIT_MAX_CHUNKS: # Too large to compare quickly
+            for result in self.load_chunks(text_chunks, lang, job):
+                yield result
+            return
+        matches = match_chunks(previous["chunks"], text_chunks)
+        changed = [x for i, x in enumerate(text_chunks) if i not in matches]
+        results = self.load_chunks(changed, lang, job)
+        try:
+            with open(previous["filename"], "rb") as f:
+                for i, chunk in enumerate(text_chunks):
+                    if job["stopped"]:
+                        break # for i, chunk
+                    if i in matches:
+                        offset, length = previous["offsets"][matches[i]]
+                        with job["timings"].timer("reuse"):
+                            f.seek(offset)
+                            content = f.read(length)
+                        job["timings"].count("reused chunks")
+                    else:
+                        content = next(results)[2]
+                    yield i, chunk, content, len(text_chunks)
+            for _ in results: # Raises error for any failed chunks
+                pass
+        finally:
+            results.close()
+
+
+    def fetch_worker(self):
+        """
+        Worker loop synthesizing queued chunks, most urgent job first,
+        honouring the backend concurrency limit. Stores (content, error)
+        into results of jobs waiting for the chunk.
+        """
+        while True:
+            job, (lang, text) = self.next_task()
+            content, error = None, None
+            if not self.is_stopped((lang, text)):
+                with self.semaphore:
+                    content, error = self.fetch(text, lang, job)
+            self.deliver((lang, text), content, error)
+
+
+    def fetch(self, text, lang, job):
+        """
+        Returns (speech audio or None, error text) from backend. Retries
+        failures with exponential backoff and jitter, honouring Retry-After
+        on rate limiting, and fails fast while the circuit breaker is open.
+        """
+        error = None
+        for attempt in range(max(1, conf.FetchRetries)):
+            if attempt and self.is_stopped((lang, text)):
+                break # for attempt
+            if not self.breaker.allow():
+                error = error or self.get_breaker_error()
+                break # for attempt
+            try:
+                with self.limiter, job["timings"].timer("fetch"):
+                    content = self.backend.synthesize(text, lang)
+                self.breaker.success()
+                return content, None
+            except Exception as e:
+                job["timings"].count("fetch errors")
+                error, delay = self.handle_failure(attempt, e)
+                if delay is None:
+                    break # for attempt
+                if attempt < conf.FetchRetries - 1:
+                    time.sleep(delay)
+        return None, error
+
+
+    def handle_failure(self, attempt, exc):
+        """
+        Registers a failed fetch attempt with the circuit breaker and the
+        rate limiter.
+
+        @return  (error text, seconds to wait before retrying,
+                  or None if retrying is of no use)
+        """
+        error = str(exc) if isinstance(exc, SpeechError) \
+                else traceback.format_exc()
+        cause = getattr(exc, "cause", None) or exc
+        status = getattr(cause, "status", None)
+        if status and 400 <= status < 500 and status not in (408, 429):
+            self.breaker.success() # Service reachable, settling any trial
+            return error, None # Client error, retrying is no use
+        self.breaker.failure()
+        delay = self.get_backoff(attempt, cause)
+        if status == 429 or isinstance(cause, HttpError) \
+        and cause.headers.get("retry-after"): # Hold off everyone
+            self.limiter.pause(delay)
+        return error, delay
+
+
+    def get_breaker_error(self):
+        """Returns error text for chunks skipped by open circuit breaker."""
+        return "Skipped after too many failures from %s, waiting %s " \
+               "seconds before trying again." % (self.backend.title,
+                                                 self.breaker.cooldown)
+
+
+    def get_stats(self):
+        """Returns a dictionary of fetch statistics, as from backend."""
+        return self.backend.get_stats()
+
+
+    def get_backoff(self, attempt, error):
+        """
+        Returns seconds to wait before retrying: exponential backoff with
+        full jitter, or longer if server asked so with Retry-After.
+        """
+        delay = random.uniform(0, conf.FetchBackoff * 2 ** attempt)
+        if isinstance(error, HttpError) and error.status in (429, 503):
+            retry_after = error.headers.get("retry-after", "").strip()
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError: # Can be HTTP date instead of seconds
+                stamp = email.utils.parsedate_tz(retry_after)
+                if stamp:
+                    delay = max(delay, email.utils.mktime_tz(stamp) -
+                                       time.time())
+        return min(delay, conf.FetchBackoffMax)
+
+
+
+def parse_text(text, maxlen=100):
+    """
+    Returns a list of sentences with less than maxlen characters.
+    Text and sentences are UTF-8 strings or Unicode.
+    """
+    return list(iter_text(text, maxlen))
+
+
+def iter_text(text, maxlen=100):
+    """
+    Yields sentences with less than maxlen characters from text as soon as
+    they are found, in one pass. Text can be a UTF-8 string or Unicode, or
+    a file-like object to read from, stripped of surrounding whitespace.
+    Sentences are UTF-8 strings unless text is Unicode.
+
+    Modified @from http://glowingpython.blogspot.com/2012/11/
+    text-to-speech-with-correct-intonation.html
+    """
+    encode = (lambda x: x) if isinstance(text, unicode) \
+             else (lambda x: x.encode("utf-8"))
+    marker = conf.SilenceMarker
+    if not isinstance(marker, unicode):
+        marker = marker.decode("utf-8")
+    punct = PUNCTUATION
+    blocks = iter_blocks(text)
+
+    # Text not longer than maxlen is one sentence, unless it has markers
+    head = u""
+    for block in blocks:
+        head += block
+        if len(head) > maxlen:
+            break # for block
+    else:
+        if marker not in head:
+            if head:
+                yield encode(head.strip())
+            return
+    words = iter_words(itertools.chain([head], blocks), marker)
+
+    # Current sentence is u" ".join(parts), kept as list to avoid copying
+    parts, size = [u""], 0
+    for w in words:
+        if marker in w:
+            sentence = u" ".join(parts).strip()
+            if sentence:
+                yield encode(sentence)
+            yield encode(w)
+            parts, size = [u""], 0
+        elif w[-1] in punct or w[0] in punct: # Encountered punctuation
+            if w[-1] in punct and (size + len(w) + 1 < maxlen):
+                # Word ends with punct and sentence can still be added to
+                yield encode(u" ".join(parts).strip() + u" " + w.strip())
+                parts, size = [u""], 0 # Save sentence and word, start new
+            elif w[0] in punct and w[-1] not in punct:
+                # Word starts with punctuation, like '('
+                sentence = u" ".join(parts).strip() # Save current
+                if sentence:
+                    yield encode(sentence)
+                parts, size = [w], len(w) # Start a new sentence with word
+            else: # word ends with punct and sentence already long enough
+                sentence = u" ".join(parts).strip()
+                if sentence:
+                    yield encode(sentence)
+                yield encode(w.strip())
+                parts, size = [u""], 0
+        elif size + len(w) + 1 < maxlen: # Sentence still short enough
+            parts.append(w)
+            size += len(w) + 1
+        else: # Sentence too long
+            sentence = u" ".join(parts).strip()
+            if sentence:
+                yield encode(sentence)
+            parts, size = [w], len(w) # Start a new sentence with the word
+    sentence = u" ".join(parts).strip()
+    if sentence:
+        yield encode(sentence)
+
+
+def iter_blocks(text):
+    """
+    Yields text as Unicode blocks with CR and tab replaced by space.
+    Strings are sliced into blocks, file-like objects are read in blocks,
+    stripping surrounding whitespace.
+    """
+    if isinstance(text, basestring):
+        blocks = (text[i:i + COPY_BUFFER_SIZE]
+                  for i in xrange(0, len(text), COPY_BUFFER_SIZE))
+        strip = False
+    else:
+        read = lambda: text.readline(COPY_BUFFER_SIZE) # Line or block
+        blocks, strip = iter(read, ""), True
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    started, pending = False, u"" # pending: trailing whitespace held back
+    for block in itertools.chain(blocks, [None]):
+        if block is None: # Flush any bytes left in decoder
+            block = decoder.decode("", final=True)
+        elif not isinstance(block, unicode):
+            block = decoder.decode(block)
+        block = block.replace(u"\r", u" ").replace(u"\t", u" ")
+        if not strip:
+            yield block
+            continue # for block
+        if not started:
+            block = block.lstrip()
+            started = bool(block)
+        content = block.rstrip()
+        if content:
+            yield pending + content
+            pending = block[len(content):]
+        else:
+            pending += block
+
+
+def iter_words(blocks, marker):
+    """
+    Yields non-empty words from text blocks split by space, dividing words
+    at silence markers: a run of markers becomes a separate word.
+    """
+    last = None # Last word, held back as markers can still be appended
+    buffer = u""
+    for block in itertools.chain(blocks, [None]):
+        if block is None:
+            words, buffer = [buffer], u""
+        else:
+            words = (buffer + block).split(u" ")
+            buffer = words.pop()
+        for w in filter(None, words):
+            w_lower = w.lower()
+            if marker not in w_lower:
+                if last is not None:
+                    yield last
+                last = w
+                continue # for w
+            text_chunks = w_lower.split(marker)
+            for i, part in enumerate(text_chunks):
+                if part:
+                    if last is not None:
+                        yield last
+                    last = part
+                    if i < len(text_chunks) - 1:
+                        yield last
+                        last = marker
+                elif last is not None and marker in last:
+                    last += marker
+                else:
+                    if last is not None:
+                        yield last
+                    last = marker
+    if last is not None:
+        yield last
+
+
+def is_edited(old, new, threshold=0.5):
+    """
+    Returns whether text looks like an edited version of the old text, by
+    a quick comparison of their sentences, for choosing load_edit().
+    """
+    split = lambda x: re.split(r"[.?!\n]+", x)
+    matcher = difflib.SequenceMatcher(None, split(old), split(new),
+                                      autojunk=False)
+    return matcher.real_quick_ratio() >= threshold \
+           and matcher.quick_ratio() >= threshold
+
+
+def match_chunks(old, new):
+    """
+    Returns {index in new: index in old} for text chunks unchanged between
+    two versions of a text.
+    """
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    return dict((j + k, i + k) for i, j, n in matcher.get_matching_blocks()
+                for k in range(n))
+
+
+def get_silence(chunk, content=None):
+    """
+    Returns MP3 silence to insert after the text chunk: longer pause for
+    sentence ends, shorter for separators like commas, per
+    conf.PauseDurations.
+
+    @param   content  chunk MP3 audio, silence is made in the same format
+    """
+    last = chunk[-1:] # Empty for an empty chunk
+    for marks, milliseconds in conf.PauseDurations.items():
+        if last and last in marks:
+            return make_silence(milliseconds, content)
+    return ""
+
+
+def make_silence(milliseconds, content=None):
+    """
+    Returns MP3 silence of given duration, rounded to whole frames, in the
+    format of given MP3 audio, or of conf.Silence if not given or not
+    recognized. Silence is cached, repeated pauses cost a dictionary lookup.
+    """
+    fmt = get_mp3_format(content) if content else None
+    key = (fmt or MP3_FORMAT, milliseconds)
+    silence = SILENCE_BLOCKS.get(key)
+    if silence is None:
+        frame, duration = make_silent_frame(fmt or MP3_FORMAT)
+        silence = frame * int(round(milliseconds / duration))
+        SILENCE_BLOCKS[key] = silence
+    return silence
+
+
+def make_silent_frame(fmt):
+    """
+    Returns an MP3 frame of silence, and its duration in milliseconds.
+    An empty Layer III frame decodes to silence: all-zero side information
+    carries no audio data.
+
+    @param   fmt  MP3 format, as returned from get_mp3_format()
+    """
+    version, bitrate, samplerate, mode = fmt
+    mpeg1 = (3 == version)
+    kbps = MP3_BITRATES[mpeg1][bitrate]
+    rate = MP3_SAMPLERATES[version][samplerate]
+    header = "".join(map(chr, [0xFF, 0xE0 | version << 3 | 0b011,
+                               bitrate << 4 | samplerate << 2, mode << 6]))
+    size = (144 if mpeg1 else 72) * kbps * 1000 // rate
+    samples = 1152 if mpeg1 else 576
+    return header + "\0" * (size - len(header)), samples * 1000. / rate
+
+
+def get_mp3_format(content):
+    """
+    Returns the format of the first MPEG Layer III frame in MP3 audio, as
+    (version bits, bitrate index, sample rate index, channel mode),
+    or None if not found near the start of content.
+    """
+    start = 0
+    if content.startswith("ID3") and len(content) >= 10: # Skip ID3v2 tag
+        sizes = [ord(x) for x in content[6:10]]
+        start = 10 + (sizes[0] << 21 | sizes[1] << 14 | sizes[2] << 7 |
+                      sizes[3]) + (10 if ord(content[5]) & 0x10 else 0)
+    end = min(len(content), start + 4096) - 3
+    i = content.find("\xFF", start, end)
+    while i >= 0:
+        b1, b2, b3 = map(ord, content[i + 1:i + 4])
+        if 0xE0 == b1 & 0xE0 and 1 != (b1 >> 3) & 3 and 1 == (b1 >> 1) & 3 \
+        and b2 >> 4 not in (0, 15) and 3 != (b2 >> 2) & 3:
+            return ((b1 >> 3) & 3, b2 >> 4, (b2 >> 2) & 3, b3 >> 6)
+        i = content.find("\xFF", i + 1, end)
+    return None
+
+
+"""MP3 format of conf.Silence, for pauses next to audio of unknown format."""
+MP3_FORMAT = get_mp3_format(SILENCE)
+for milliseconds in conf.PauseDurations.values() + [conf.PauseMarker]:
+    make_silence(milliseconds) # Prepare common pauses in advance
+
+
+def merge_chunks(filenames, chunks, filename, timings=None):
+    """
+    Merges audio chunk files into one file, adding silence for separators.
+
+    @param   filenames  list of chunk MP3 files
+    @param   chunks     list of text chunks, corresponding to filenames
+    @param   filename   name of the merged MP3 file to write
+    @param   timings    Timings to record merge duration into, if any
+    """
+    started = time.time()
+    with SpeechWriter(filename) as writer:
+        for i, chunk_filename in enumerate(filenames):
+            writer.write_file(chunks[i], chunk_filename)
+    if timings:
+        timings.add("merge", time.time() - started)
+
+
+
+class SpeechWriter(object):
+    """
+    Writes speech into an MP3 file chunk by chunk, as chunks arrive, adding
+    silence after separators. MP3s can be simply concatenated together,
+    result is legible.
+    """
+
+    def __init__(self, filename, timings=None):
+        """
+        @param   filename  name of the MP3 file to write, or a writable
+                           file-like object like a network stream
+        @param   timings   Timings to record write durations into, if any
+        """
+        self.filename = getattr(filename, "name", filename)
+        self.timings = timings
+        self.owned = isinstance(filename, basestring)
+        self.file = open(filename, "wb") if self.owned else filename
+        self.position = 0 # Bytes written so far
+        self.offsets = [] # [(chunk audio offset, chunk audio length), ]
+
+
+    def write(self, chunk, content):
+        """Appends chunk audio content and the following silence."""
+        started = time.time()
+        self.offsets.append((self.position, len(content)))
+        silence = get_silence(chunk, content)
+        self.file.write(content)
+        self.file.write(silence)
+        self.position += len(content) + len(silence)
+        if self.timings:
+            self.timings.add("write", time.time() - started)
+
+
+    def write_file(self, chunk, filename):
+        """Appends chunk audio from file and the following silence."""
+        with open(filename, "rb") as f:
+            head = f.read(COPY_BUFFER_SIZE)
+            self.file.write(head)
+            shutil.copyfileobj(f, self.file, COPY_BUFFER_SIZE)
+            length = f.tell()
+        silence = get_silence(chunk, head)
+        self.offsets.append((self.position, length))
+        self.file.write(silence)
+        self.position += length + len(silence)
+
+
+    def flush(self):
+        """Flushes written audio, for readers of a growing file."""
+        self.file.flush()
+
+
+    def close(self):
+        """Closes the output file, if opened by writer."""
+        if self.owned:
+            self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+
+class ChunkCache(object):
+    """
+    Persistent cache of audio chunks keyed by (language code, sentence),
+    kept compactly in a few segment files: chunks are appended to the newest
+    data file, and records of (key hash, offset, length) to its index file.
+    Data files are read via memory maps. When total size exceeds the limit,
+    the oldest segment is dropped whole, chunks used from older segments
+    having been copied forward into the newest. Shared by processes via
+    a lock file; thread-safe.
+    """
+    RECORD = struct.Struct("<20sQI") # Index record: SHA-1, offset, length
+    SEGMENTS = 8 # Number of segments the size limit is divided into
+
+
+    def __init__(self, path, size_limit, namespace=""):
+        """
+        @param   namespace  additional key for cached chunks, like backend name
+        """
+        self.path = path
+        self.size_limit = size_limit
+        self.segment_limit = size_limit // self.SEGMENTS
+        self.namespace = namespace
+        self.hits = self.misses = 0
+        self.size = 0 # Total bytes of all segment data files
+        self.index = {} # {key hash: (segment number, offset, length)}
+        # {segment number: {"size": data bytes, "read": index bytes read,
+        #                   "map": mmap of data file or None}}, oldest first
+        self.segments = collections.OrderedDict()
+        self.lock = threading.Lock()
+        if self.size_limit <= 0:
+            return
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            self.lockname = os.path.join(self.path, "cache.lock")
+            self.refresh()
+            self.convert()
+        except Exception:
+            self.size_limit = 0 # Directory unusable: disable caching
+
+
+    def get(self, lang, text):
+        """Returns cached content for the language and text, or None."""
+        key, content = self.make_key(lang, text), None
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None and self.size_limit > 0:
+                self.refresh() # Check for chunks stored by other processes
+                entry = self.index.get(key)
+            if entry is not None:
+                content = self.read(entry)
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                older = list(self.segments)[:len(self.segments) // 2]
+                if entry[0] in older: # Copy forward, keep from eviction
+                    self.append(key, content)
+        return content
+
+
+    def has(self, lang, text):
+        """Returns whether the language and text are in cache."""
+        key = self.make_key(lang, text)
+        with self.lock:
+            if key not in self.index and self.size_limit > 0:
+                self.refresh()
+            return key in self.index
+
+
+    def put(self, lang, text, content):
+        """Stores content for the language and text, evicting if needed."""
+        if self.size_limit <= 0 or len(content) > self.segment_limit:
+            return
+        key = self.make_key(lang, text)
+        with self.lock:
+            if key not in self.index:
+                self.append(key, content)
+
+
+    def read(self, entry):
+        """Returns content for (segment, offset, length), or None if gone."""
+        number, offset, length = entry
+        segment = self.segments.get(number)
+        try:
+            if segment["map"] is None or len(segment["map"]) < offset + length:
+                if segment["map"] is not None:
+                    segment["map"].close()
+                with open(self.make_filename(number, "dat"), "rb") as f:
+                    segment["map"] = mmap.mmap(f.fileno(), 0,
+                                               access=mmap.ACCESS_READ)
+            return segment["map"][offset:offset + length]
+        except Exception: # Segment dropped by another process
+            self.refresh()
+            return None
+
+
+    def append(self, key, content):
+        """Appends content to the newest segment, starting new if full."""
+        try:
+            with open(self.lockname, "a+b") as lockfile:
+                lock_file(lockfile)
+                try:
+                    self.refresh()
+                    number = next(reversed(self.segments), 0)
+                    if not number or self.segments[number]["size"] + \
+                    len(content) > self.segment_limit:
+                        number += 1
+                        self.segments[number] = {"size": 0, "read": 0,
+                                                 "map": None}
+                    segment = self.segments[number]
+                    with open(self.make_filename(number, "dat"), "ab") as f:
+                        f.seek(0, os.SEEK_END)
+                        offset = f.tell()
+                        f.write(content)
+                    with open(self.make_filename(number, "idx"), "ab") as f:
+                        f.write(self.RECORD.pack(key, offset, len(content)))
+                    self.index[key] = (number, offset, len(content))
+                    segment["read"] += self.RECORD.size
+                    segment["size"] = offset + len(content)
+                    self.size += len(content)
+                    self.evict()
+                finally:
+                    unlock_file(lockfile)
+        except Exception: pass # Caching is best effort
+
+
+    def refresh(self):
+        """
+        Reads index records added by other processes, and drops segments
+        removed by other processes. Deletes data files left from dropped
+        segments.
+        """
+        names = os.listdir(self.path)
+        numbers = sorted(int(x[:-4]) for x in names
+                         if x.endswith(".idx") and x[:-4].isdigit())
+        for number in set(self.segments) - set(numbers):
+            self.drop(number, unlink=False)
+        for name in names: # Data files can stay while in use elsewhere
+            if name.endswith(".dat") and name[:-4].isdigit() \
+            and int(name[:-4]) < max(numbers or [0]) \
+            and int(name[:-4]) not in numbers:
+                try:
+                    os.unlink(os.path.join(self.path, name))
+                except Exception: pass
+        for number in numbers:
+            segment = self.segments.setdefault(number, {"size": 0,
+                                               "read": 0, "map": None})
+            try:
+                with open(self.make_filename(number, "idx"), "rb") as f:
+                    f.seek(segment["read"])
+                    data = f.read()
+            except (IOError, OSError): # Dropped by another process
+                self.drop(number, unlink=False)
+                continue # for number
+            for i in range(0, len(data) - self.RECORD.size + 1,
+                           self.RECORD.size):
+                key, offset, length = self.RECORD.unpack_from(data, i)
+                self.index[key] = (number, offset, length)
+                segment["read"] += self.RECORD.size
+                self.size += max(0, offset + length - segment["size"])
+                segment["size"] = max(segment["size"], offset + length)
+        self.segments = collections.OrderedDict(sorted(self.segments.items()))
+
+
+    def evict(self):
+        """Drops oldest segments until within size limit."""
+        while self.size > self.size_limit and len(self.segments) > 1:
+            if not self.drop(next(iter(self.segments))):
+                break # while self.size
+
+
+    def drop(self, number, unlink=True):
+        """
+        Drops the segment and its entries, deleting its files if unlink.
+        Returns False if index file could not be deleted, like when in use.
+        Data file is deleted later if still mapped by other processes.
+        """
+        segment = self.segments[number]
+        if segment["map"] is not None:
+            segment["map"].close()
+            segment["map"] = None
+        if unlink:
+            try:
+                os.unlink(self.make_filename(number, "idx"))
+            except Exception:
+                return False
+            try:
+                os.unlink(self.make_filename(number, "dat"))
+            except Exception: pass
+        del self.segments[number]
+        self.size -= segment["size"]
+        for key, entry in self.index.items():
+            if entry[0] == number:
+                del self.index[key]
+        return True
+
+
+    def convert(self):
+        """Moves chunks from files of an older cache version into segments."""
+        files = []
+        for name in os.listdir(self.path):
+            filename = os.path.join(self.path, name)
+            if re.match(r"^[0-9a-f]{40}\.mp3$", name):
+                files.append((os.path.getmtime(filename), name, filename))
+        with self.lock:
+            for mtime, name, filename in sorted(files):
+                with open(filename, "rb") as f:
+                    content = f.read()
+                key = name[:40].decode("hex")
+                if key not in self.index and len(content) <= self.segment_limit:
+                    self.append(key, content)
+                os.unlink(filename)
+
+
+    def get_stats(self):
+        """Returns a dictionary of cache hits, misses, entries and size."""
+        return {"hits": self.hits, "misses": self.misses,
+                "count": len(self.index), "size": self.size}
+
+
+    def make_filename(self, number, extension):
+        """Returns the path of a segment data or index file."""
+        return os.path.join(self.path, "%08d.%s" % (number, extension))
+
+
+    def make_key(self, lang, text):
+        """Returns the cache key for the language and text, as SHA-1 hash."""
+        if isinstance(text, unicode):
+            text = text.encode("utf-8")
+        key = "%s\n%s\n%s" % (self.namespace, lang, text)
+        return hashlib.sha1(key).digest()
+
+
+
+def lock_file(f, blocking=True):
+    """
+    Locks the open file exclusively, against other processes and other open
+    handles of the same file. Returns whether lock was acquired.
+    """
+    try:
+        if fcntl:
+            flags = fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+            fcntl.flock(f.fileno(), flags)
+        else:
+            f.seek(0)
+            mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+            msvcrt.locking(f.fileno(), mode, 1)
+        return True
+    except (IOError, OSError):
+        if blocking:
+            raise
+        return False
+
+
+def unlock_file(f):
+    """Releases lock on the open file."""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    except (IOError, OSError):
+        pass
+
+
+def log_metrics(timings, **info):
+    """
+    Appends conversion timings and given info as a JSON line to
+    conf.MetricsLog, if configured.
+    """
+    if not conf.MetricsLog:
+        return
+    entry = collections.OrderedDict(
+        [("time", datetime.datetime.now().isoformat())] +
+        sorted(info.items()) + timings.get_stats().items())
+    try:
+        with open(conf.MetricsLog, "ab") as f:
+            f.write(json.dumps(entry) + "\n")
+    except Exception:
+        traceback.print_exc()
+
+
+def unique_path(pathname):
+    """
+    Returns a unique version of the path. If a file or directory with the
+    same name already exists, returns a unique version
+    (e.g. "C:\config (2).sys" if ""C:\config.sys" already exists).
+    """
+    result = pathname
+    base, ext = os.path.splitext(result)
+    counter = 2
+    while os.path.exists(result):
+        result = "%s (%s)%s" % (base, counter, ext)
+        counter += 1
+    return result
+
+
+def batch(path, output_dir, lang="en", encoding="utf-8", processes=None,
+          out=None, backend=None):
+    """
+    Converts a batch of text files into MP3 files, one per input file, with
+    a pool of processes. Sentences repeated across the batch are downloaded
+    only once, via the (language, sentence) key of the chunk cache, as far
+    as the cache can hold them. Documents with some chunks failed are kept,
+    failed chunks being silence, but reported as errors.
+
+    @param   path        directory of .txt files, or a manifest file listing
+                         a text file per line, optionally followed by a tab
+                         and a language code
+    @param   output_dir  directory to write MP3 files into, named after
+                         input files, existing files are overwritten
+    @param   lang        default language code
+    @param   encoding    encoding of input texts
+    @param   processes   number of processes, defaults to CPU count
+    @param   out         file-like object to write progress report to
+    @param   backend     backend name, by default conf.Backend
+    @return              list of result dictionaries, in input order
+    """
+    started = time.time()
+    entries = read_batch_entries(path, lang, output_dir)
+    backend = backend or conf.Backend
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes, initializer=init_batch_worker,
+                                initargs=(backend, ))
+    try:
+        # Parse all texts and gather unique chunks not in cache yet
+        args = [(x["input"], encoding) for x in entries]
+        for entry, result in zip(entries, pool.map(batch_parse, args)):
+            entry.update(result)
+        cache = ChunkCache(conf.CacheDirectory, conf.CacheSizeLimit, backend)
+        missing = collections.OrderedDict() # {(lang, chunk): True, }
+        chunk_count = 0
+        for entry in entries:
+            for chunk in entry.get("chunks") or []:
+                chunk_count += 1
+                key = (entry["lang"], chunk)
+                if conf.SilenceMarker not in chunk.lower() \
+                and key not in missing and not cache.has(*key):
+                    missing[key] = True
+        # Download unique chunks into cache, in groups per language, as
+        # many as cache can hold without evicting them again before use:
+        # documents fetch the rest themselves
+        tasks, group_size = [], 10 * max(1, conf.FetchWorkers)
+        for lang_code, chunk in missing:
+            if not tasks or tasks[-1][0] != lang_code \
+            or len(tasks[-1][1]) >= group_size:
+                tasks.append((lang_code, []))
+            tasks[-1][1].append(chunk)
+        budget = cache.size_limit * (cache.SEGMENTS - 1) // cache.SEGMENTS
+        prefetched, fetched, size = 0, 0, 0
+        while tasks and budget > 0:
+            wave, tasks = tasks[:processes], tasks[processes:]
+            wave_count = sum(len(x[1]) for x in wave)
+            if prefetched and size + size * wave_count / prefetched > budget:
+                break # while tasks
+            for result in pool.imap_unordered(batch_fetch, wave):
+                fetched += result["fetched"]
+                size += result["size"]
+            prefetched += wave_count
+        # Write output files from cache, reporting in input order
+        results = pool.imap(batch_write, [x for x in entries
+                                          if not x.get("error")])
+        for entry in entries:
+            if not entry.get("error"):
+                entry.update(next(results))
+            batch_report(out, entry)
+    finally:
+        pool.terminate()
+
+    elapsed = max(time.time() - started, 1e-6)
+    done = [x for x in entries if not x.get("error")]
+    size = sum(x["size"] for x in done)
+    fetched += sum(x.get("fetched", 0) for x in entries)
+    failed = sum(x.get("failed", 0) for x in entries)
+    if out:
+        out.write("\n%s documents converted, %s failed, in %.2f seconds.\n" %
+                  (len(done), len(entries) - len(done), elapsed))
+        out.write("%s chunks in total, %s downloaded, %s from cache or "
+                  "repeated in batch, %s failed.\n" % (chunk_count, fetched,
+                  max(0, chunk_count - fetched - failed), failed))
+        out.write("Throughput: %.1f documents/s, %.1f chunks/s, %.1f KB/s "
+                  "MP3 written.\n" % (len(done) / elapsed,
+                  chunk_count / elapsed, size / 1024. / elapsed))
+    return entries
+
+
+def read_batch_entries(path, lang, output_dir):
+    """
+    Returns a list of batch entries from a directory or manifest file,
+    as [{"input", "lang", "output"}, ].
+    """
+    entries = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(".txt"):
+                entries.append({"input": os.path.join(path, name),
+                                "lang": lang})
+    else:
+        with open(path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue # for line
+                parts = line.split("\t")
+                filename = os.path.join(os.path.dirname(path), parts[0])
+                entries.append({"input": filename, "lang":
+                                parts[1].strip() if parts[1:] else lang})
+    outputs = set()
+    for entry in entries:
+        base = os.path.splitext(os.path.basename(entry["input"]))[0]
+        filename = os.path.join(output_dir, "%s.mp3" % base)
+        counter = 2
+        while filename in outputs: # Same name from different directories
+            filename = os.path.join(output_dir, "%s (%s).mp3" % (base, counter))
+            counter += 1
+        outputs.add(filename)
+        entry["output"] = filename
+    return entries
+
+
+def batch_report(out, entry):
+    """Writes a batch entry result line into output stream, if any."""
+    if not out:
+        return
+    if entry.get("error"):
+        out.write("%s: ERROR %s\n" % (entry["input"], entry["error"]))
+    else:
+        out.write("%s -> %s: %s chunks, %s bytes, %.2f seconds.\n" % (
+                  entry["input"], entry["output"], len(entry["chunks"]),
+                  entry["size"], entry["elapsed"]))
+
+
+"""SpeechLoader instance in batch worker processes."""
+batch_loader = None
+
+
+def init_batch_worker(backend):
+    """Initializes a batch worker process with the named backend."""
+    global batch_loader
+    batch_loader = make_loader(backend)
+
+
+def batch_parse(args):
+    """Returns {"chunks"} or {"error"} for (batch input file, encoding)."""
+    filename, encoding = args
+    try:
+        with open(filename, "rb") as f:
+            text = f.read().decode(encoding).strip()
+        if not text:
+            return {"error": "no text to speak"}
+        return {"chunks": batch_loader.parse_text(text.encode("utf-8"))}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def batch_fetch(args):
+    """
+    Downloads (language, chunks) into cache, returns {"fetched": number of
+    chunks downloaded, "size": bytes loaded}. Errors are ignored here,
+    failing chunks are retried and reported when writing documents.
+    """
+    lang, chunks = args
+    job, size = batch_loader.make_job(PRIORITY_BACKGROUND), 0
+    try:
+        for i, chunk, content, count in batch_loader.load_chunks(chunks, lang,
+                                                                 job):
+            size += len(content)
+    except Exception:
+        pass
+    return {"fetched": get_fetch_count(job["timings"]), "size": size}
+
+
+def batch_write(entry):
+    """
+    Writes batch entry MP3, returns {"size", "elapsed", "fetched"} or
+    {"error", "fetched", "failed": number of chunks failed}. Output is kept
+    if some chunks succeeded, failed ones being silence.
+    """
+    started = time.time()
+    job, count = batch_loader.make_job(), None
+    try:
+        with SpeechWriter(entry["output"], job["timings"]) as writer:
+            for i, chunk, content, count in batch_loader.load_chunks(
+            entry["chunks"], entry["lang"], job):
+                writer.write(chunk, content)
+        log_metrics(job["timings"], mode="batch", lang=entry["lang"],
+                    output=entry["output"], chunks=len(entry["chunks"]),
+                    size=writer.position)
+        return {"size": os.path.getsize(entry["output"]),
+                "elapsed": time.time() - started,
+                "fetched": get_fetch_count(job["timings"])}
+    except Exception as e:
+        error, fetched = str(e).split("\n")[0], get_fetch_count(job["timings"])
+        errors = getattr(e, "errors", None) or []
+        if 0 < len(errors) < (count or 0):
+            error = "%s, output kept." % error.rstrip(":")
+        else:
+            try: os.unlink(entry["output"])
+            except Exception: pass
+        failed = len(errors) or len(entry["chunks"]) - fetched
+        return {"error": error, "fetched": fetched, "failed": failed}
+
+
+def get_fetch_count(timings):
+    """Returns the number of chunks successfully downloaded in timings."""
+    stats = timings.get_stats()
+    calls = stats["timers"].get("fetch", {}).get("calls", 0)
+    return max(0, calls - stats["counters"].get("fetch errors", 0))
+
+
+def main():
+    """Entry point for command-line use, writes text speech into an MP3."""
+    argparser = argparse.ArgumentParser(prog="textspeak",
+        description="Converts text to speech MP3 via the Google Translate "
+                    "online service or another text-to-speech backend.")
+    argparser.add_argument("text", nargs="*",
+        help="text to speak, read from --input or stdin if not given")
+    argparser.add_argument("-i", "--input", metavar="FILE",
+        help="text file to speak, - for stdin")
+    argparser.add_argument("-o", "--output", metavar="FILE",
+        help="MP3 file to write, default speech_<lang>_<datetime>.mp3")
+    argparser.add_argument("-l", "--lang", default="en",
+        choices=[x[0] for x in conf.Languages], metavar="LANG",
+        help="speech language code (default %(default)s)")
+    argparser.add_argument("-e", "--encoding", default="utf-8",
+        help="encoding of input text (default %(default)s)")
+    argparser.add_argument("--backend", default=conf.Backend,
+        choices=list(BACKENDS), help="text-to-speech backend: %s "
+        "(default %%(default)s)" % ", ".join("%s - %s" % (x.name, x.title)
+                                             for x in BACKENDS.values()))
+    argparser.add_argument("--engine", default=conf.FetchEngine,
+        choices=["threads", "async"], help="engine for fetching from online "
+        "services: worker threads, or a single thread with non-blocking "
+        "sockets (default %(default)s)")
+    argparser.add_argument("-b", "--batch", metavar="PATH",
+        help="convert a batch of texts into one MP3 each: a directory of "
+             ".txt files, or a manifest file with a text file per line "
+             "(optionally followed by tab and language code)")
+    argparser.add_argument("-d", "--output-dir", metavar="DIR", default=".",
+        help="directory for batch output files (default current directory)")
+    argparser.add_argument("-p", "--processes", metavar="N", type=int,
+        help="number of processes for batch (default CPU count)")
+    argparser.add_argument("-t", "--timings", action="store_true",
+        help="print time spent in parsing, fetching, writing etc, to stderr")
+    argparser.add_argument("-s", "--serve", metavar="[HOST:]PORT", nargs="?",
+        const="", help="run as HTTP service, converting POSTed text to "
+        "streamed MP3 (default %s:%s)" % (conf.ServerHost, conf.ServerPort))
+    args = argparser.parse_args()
+    conf.FetchEngine = args.engine
+
+    if args.serve is not None:
+        import server # Imported here as it builds on this module
+        server.serve(args.serve, args.backend, sys.stdout)
+        sys.exit()
+
+    if args.batch:
+        if not os.path.exists(args.output_dir):
+            os.makedirs(args.output_dir)
+        entries = batch(args.batch, args.output_dir, args.lang,
+                        args.encoding, args.processes, sys.stdout,
+                        args.backend)
+        sys.exit(1 if any(x.get("error") for x in entries) else 0)
+
+    if args.text and not args.input:
+        text = " ".join(args.text).decode(args.encoding).strip()
+        if not text:
+            argparser.error("no text to speak")
+    else: # Stream from file or stdin, synthesis starts while reading
+        f = open(args.input, "rb") if args.input not in (None, "-") \
+            else sys.stdin
+        text = codecs.getreader(args.encoding)(f)
+    filename = args.output or unique_path("speech_%s_%s.mp3" % (
+               args.lang, datetime.datetime.now().strftime("%Y%m%d-%H%M%S")))
+
+    loader = make_loader(args.backend)
+    job, count, writer = loader.make_job(), 0, None
+    try:
+        try:
+            with SpeechWriter(filename, job["timings"]) as writer:
+                for i, chunk, content, _ in loader.load(text, args.lang, job):
+                    writer.write(chunk, content)
+                    count += 1
+        finally:
+            if args.timings:
+                sys.stderr.write("%s\n" % job["timings"].get_report())
+            log_metrics(job["timings"], mode="cli", lang=args.lang,
+                        backend=loader.backend.name, output=filename,
+                        chunks=count, size=writer.position if writer else 0)
+        if not count:
+            raise SpeechError("No text to speak.")
+    except Exception as e:
+        # Keep output if some chunks succeeded, failed ones being silence
+        partial = 0 < len(getattr(e, "errors", None) or []) < count
+        if not partial:
+            try: os.unlink(filename)
+            except Exception: pass
+        sys.stderr.write("%s\n" % (e if isinstance(e, SpeechError)
+                                   else traceback.format_exc()))
+        if partial:
+            sys.stdout.write("%s\n" % filename)
+        sys.exit(1)
+    sys.stdout.write("%s\n" % filename)
+
+
+if "__main__" == __name__:
+    main()
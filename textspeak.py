@@ -14,24 +14,40 @@ Released under the MIT License.
 @author      Erki Suurjaak
 @created     07.11.2012
 @modified    02.03.2015
+
+Run with --startup to print where program launch time goes, and exit.
 """
-import base64
+import cgi
 import datetime
+import hashlib
 import os
 import Queue
 import shutil
 import sys
+import tempfile
 import threading
+import time
 import traceback
-import urllib2
+
+"""Time of starting to import program modules, for startup timings."""
+STARTED = time.time()
+
+if "__main__" == __name__ and sys.argv[1:] \
+and "--startup" not in sys.argv[1:]:
+    # Command-line mode, before importing wx as it is not required
+    import speech
+    speech.main()
+    sys.exit()
+
 import wx
+import wx.html
 import wx.lib.newevent
-import wx.lib.scrolledpanel
 import wx.lib.sized_controls
 import wx.media
-import wx.py
 
 import conf
+import server
+import speech
 
 """Event class and event binder for new results."""
 ResultEvent, EVT_RESULT = wx.lib.newevent.NewEvent()
@@ -40,14 +56,19 @@ ResultEvent, EVT_RESULT = wx.lib.newevent.NewEvent()
 class TextSpeakWindow(wx.Frame):
     """TextSpeak GUI window."""
 
-    def __init__(self):
+    def __init__(self, startup=None):
+        """
+        @param   startup  speech.Timings to record startup stages into, if any
+        """
+        self.startup = startup or speech.Timings()
         wx.Frame.__init__(self, parent=None,
                           title=conf.Title, size=conf.WindowSize)
 
         self.data = {}
+        self.text_index = {} # {(lang, text digest): text ID} for history
         self.text = None
         self.text_id = None # ID of currently selected text
-        self.panels_history = []
+        self.save_on_exit = True # Whether to save configuration on exit
         # In Windows 7 and Vista the wx.media.MediaCtrl fires state change
         # events unreliably, so cannot use sequential play.
         self.mc_hack = hasattr(sys, "getwindowsversion") \
@@ -57,6 +78,7 @@ class TextSpeakWindow(wx.Frame):
             icons.AddIcon(wx.ArtProvider_GetIcon(
                 wx.ART_TICK_MARK, wx.ART_FRAME_ICON, (s, s)))
         self.SetIcons(icons)
+        self.icons = icons
 
         panel_frame = wx.lib.sized_controls.SizedPanel(self)
         panel_frame.SetSizerType("vertical")
@@ -123,11 +145,9 @@ class TextSpeakWindow(wx.Frame):
         panel_side = wx.lib.sized_controls.SizedPanel(splitter)
         panel_side.SetSizerType("vertical")
 
-        panel_list = self.panel_list = \
-            wx.lib.scrolledpanel.ScrolledPanel(panel_side)
-        panel_list.BackgroundColour = "WHITE"
-        panel_list.SetSizerProps(expand=True, proportion=100)
-        panel_list.Sizer = wx.BoxSizer(wx.VERTICAL)
+        list_history = self.list_history = \
+            HistoryList(panel_side, self.on_open_text)
+        list_history.SetSizerProps(expand=True, proportion=100)
 
         panel_side.Sizer.AddStretchSpacer()
         panel_btm = wx.lib.sized_controls.SizedPanel(panel_side)
@@ -148,16 +168,13 @@ class TextSpeakWindow(wx.Frame):
                                       "at %s" % conf.URLHomepage
         self.link_www.SetSizerProps(halign="right")
 
+        self.startup.lap("window controls")
+
         self.out_queue = Queue.Queue()
         self.mp3_loader = TextToMP3Loader(self, self.out_queue)
-        self.dialog_save = wx.FileDialog(
-            parent=self,
-            defaultDir=os.getcwd(),
-            style=wx.FD_OVERWRITE_PROMPT | wx.FD_SAVE | wx.RESIZE_BORDER)
-        self.frame_console = wx.py.shell.ShellFrame(
-            parent=self, title="%s Console" % conf.Title)
-        self.frame_console.SetIcons(icons)
-        self.frame_console.Enabled = False # Flag for first toggle
+        self.dialog_save = None # Created on first use
+        self.frame_console = None # Created on first use
+        self.startup.lap("speech loader")
 
         if not self.mc_hack:
             mc.Bind(wx.media.EVT_MEDIA_LOADED, self.on_media_loaded)
@@ -175,7 +192,6 @@ class TextSpeakWindow(wx.Frame):
         self.Bind(wx.EVT_CLOSE, self.on_exit)
         self.Bind(wx.EVT_SIZE, self.on_size)
         self.Bind(wx.EVT_SPLITTER_SASH_POS_CHANGED, self.on_size, splitter)
-        self.frame_console.Bind(wx.EVT_CLOSE, self.on_toggle_console)
         self.text_version.Bind(wx.EVT_LEFT_DCLICK, self.on_toggle_console)
 
         conf.load()
@@ -196,12 +212,14 @@ class TextSpeakWindow(wx.Frame):
         else:
             self.Center(wx.HORIZONTAL)
             self.Position.top = 50
+        self.startup.lap("configuration")
 
         sashPos = 3 * self.Size.width / 4
         splitter.SplitVertically(panel_main, panel_side, sashPosition=sashPos)
         self.Show(True)
         self.edit_text.SetFocus()
         self.edit_text.SetInsertionPoint(-1)
+        self.startup.lap("show window")
 
 
     def on_size(self, event):
@@ -214,14 +232,15 @@ class TextSpeakWindow(wx.Frame):
 
 
     def on_exit(self, event):
-        """Handler on application exit, saves configuration."""
+        """Handler on application exit, saves configuration if enabled."""
         conf.LastText = self.edit_text.Value
         conf.LastLanguage = conf.Languages[self.list_lang.Selection][0]
         if not self.mediactrl.Tell() < 0: # Nothing loaded and 0 volume if -1
             conf.LastVolume = round(self.mediactrl.GetVolume(), 2)
         conf.WindowPosition = self.Position[:]
         conf.WindowSize = [-1, -1] if self.IsMaximized() else self.Size[:]
-        conf.save()
+        if self.save_on_exit:
+            conf.save()
         event.Skip()
 
 
@@ -230,8 +249,12 @@ class TextSpeakWindow(wx.Frame):
         if isinstance(event, wx.MouseEvent) \
         and not (event.CmdDown() and event.ShiftDown()):
             return # Must be Ctrl-Shift-doubleclick
-        if not self.frame_console.Enabled: # First view: set position and size
-            self.frame_console.Enabled = True
+        if not self.frame_console: # First view: create, set position and size
+            from wx.py import shell # Imported on demand, as slow to load
+            self.frame_console = shell.ShellFrame(
+                parent=self, title="%s Console" % conf.Title)
+            self.frame_console.SetIcons(self.icons)
+            self.frame_console.Bind(wx.EVT_CLOSE, self.on_toggle_console)
             self.frame_console.Size = (self.Size.width, self.Size.height / 3)
             self.frame_console.Position = (self.Position.x,
                                            self.Position.y + self.Size.height)
@@ -241,23 +264,58 @@ class TextSpeakWindow(wx.Frame):
     def on_result_event(self, event):
         """Handler for a result chunk from TextToMP3Loader."""
         text_id = event.TextId
-        data = self.data[text_id]
+        data = self.data.get(text_id)
+        if not data or data["stopped"]: # Cancelled or dropped from history
+            if getattr(event, "Filename", None):
+                try:
+                    os.unlink(event.Filename)
+                except Exception: pass
+            return
         if hasattr(event, "Error"):
+            # Not complete: speaking the same text again retries it
+            data["completed"] = False
+            self.unindex_text(data)
+            if not os.path.exists(data.get("merged") or ""):
+                # Output discarded as no chunk succeeded: drop all audio
+                if self.text_id == text_id:
+                    self.mediactrl.Stop()
+                    self.button_save.Enabled = False
+                for f in data["filenames"]:
+                    try:
+                        os.unlink(f)
+                    except Exception: pass
+                data.update(filenames=[], merged=None, current=None,
+                            position=-1)
             wx.MessageBox(event.Error, conf.Title, wx.ICON_WARNING | wx.OK)
             return
-        index, count = event.Index, event.Count
-        chunks, filename = event.Chunks, event.Filename
+        data["timings"].add("event", time.time() - event.Posted)
+        index, count = event.Index, event.Count # Count None if not known yet
+        filename = event.Filename
         data["count"] = count
-        data["chunks"] = chunks
-        data["filenames"].append(filename)
-        is_first = (self.text_id == text_id) \
-                   and (len(data["filenames"]) == 1)
-        is_last = (index == data["count"] - 1)
+        data["chunks"].append(event.Chunk)
+        data["merged"] = event.Merged
+        data["stream"], data["stream_path"] = event.Stream, event.StreamPath
+        if filename: # Chunk files are only created for sequential play
+            data["filenames"].append(filename)
+        is_first = (self.text_id == text_id) and (index == 0)
+        is_last = (count is not None and index == count - 1)
         is_volumeset = not self.mediactrl.Tell() < 0
-        if is_last and (self.mc_hack
-        or wx.media.MEDIASTATE_PLAYING != self.mediactrl.State):
+        is_playing = wx.media.MEDIASTATE_PLAYING == self.mediactrl.State
+        if is_last and is_playing and (data["progressive"]
+        or not (self.mc_hack or data["sequential"])):
+            # All chunks finished, take merged file, leave playback running
+            current = data["current"]
+            self.merge_chunks(data)
+            if current and current == data["stream"]: # Still playing stream
+                data.update(current=current, position=-1)
+            else:
+                self.drop_stream(data)
+            data["completed"] = True
+            self.button_save.Enabled = (self.text_id == text_id)
+        elif is_last and (self.mc_hack or not is_playing):
             # All chunks finished, merge them into one
             self.merge_chunks(data)
+            self.drop_stream(data)
             data["completed"] = True
             self.text_id = text_id
             if not is_first or self.mc_hack:
@@ -267,19 +325,32 @@ class TextSpeakWindow(wx.Frame):
                     self.mediactrl.SetVolume(conf.LastVolume)
                 wx.CallLater(500, self.mediactrl.Play)
             self.button_save.Enabled = True
-        if is_first and (is_last or not (self.mc_hack or data["allatonce"])):
+        if is_first and (is_last or data["progressive"]
+        or not (self.mc_hack or data["allatonce"])):
             # First result: set playing at once
-            data["current"] = data["filenames"][-1]
-            self.mediactrl.Load(data["current"])
+            if is_last or not data["progressive"]:
+                data.update(current=data["filenames"][-1],
+                            position=len(data["filenames"]) - 1)
+                self.mediactrl.Load(data["current"])
+            else: # Play from merged file growing as chunks arrive
+                data.update(current=data["stream"], position=-1)
+                self.mediactrl.LoadURI(data["current"])
+                if self.mc_hack:
+                    wx.CallLater(500, self.mediactrl.Play)
             if not is_volumeset:
                 self.mediactrl.SetVolume(conf.LastVolume)
-        if data["allatonce"]:
-            self.gauge.SetValue(100.0 * (index + 1) / data["count"])
+        if data["allatonce"] or data["progressive"]:
+            self.update_gauge(index, count)
 
 
     def on_save_mp3(self, event):
         """Handler for clicking to save the merged MP3 file."""
         data = self.data[self.text_id]
+        if not self.dialog_save:
+            self.dialog_save = wx.FileDialog(
+                parent=self,
+                defaultDir=os.getcwd(),
+                style=wx.FD_OVERWRITE_PROMPT | wx.FD_SAVE | wx.RESIZE_BORDER)
         self.dialog_save.Filename = data["filenames"][0]
         if wx.ID_OK == self.dialog_save.ShowModal():
             try:
@@ -292,8 +363,9 @@ class TextSpeakWindow(wx.Frame):
         """Handler for the speak button, sends entered text for processing."""
         text = self.edit_text.Value.strip()
         lang = conf.Languages[self.list_lang.Selection][0]
-        text_present = [i for i in self.data.values()
-                        if i["text"] == text and i["lang"] == lang]
+        text_key = self.get_text_key(lang, text)
+        text_present = self.data.get(self.text_index.get(text_key))
+        previous = self.data.get(self.text_id)
         if not text:
             pass
         elif not text_present:
@@ -301,61 +373,54 @@ class TextSpeakWindow(wx.Frame):
             data = self.data[self.text_id] = {"filenames": [], "lang": lang,
                 "lang_text": conf.Languages[self.list_lang.Selection][1],
                 "text": text, "current": None, "count": 0, "id": self.text_id,
+                "chunks": [], "used": time.time(), "position": -1,
                 "datetime": datetime.datetime.now(), "stopped": False,
-                "completed": False, "allatonce": self.cb_allatonce.Value
+                "completed": False, "allatonce": self.cb_allatonce.Value,
             }
+            # Checkbox is hidden with mc_hack, playing progressively if able
+            data["progressive"] = bool(self.mp3_loader.streamer) \
+                and conf.ProgressivePlayback \
+                and (self.mc_hack or not data["allatonce"])
+            data["allatonce"] = data["allatonce"] and not data["progressive"]
+            data["sequential"] = not (self.mc_hack or data["allatonce"]
+                                      or data["progressive"])
+            if previous and previous["lang"] == lang \
+            and previous["completed"] and previous.get("offsets") \
+            and previous["filenames"] == [previous["merged"]] \
+            and len(previous["chunks"]) <= speech.SpeechLoader.EDIT_MAX_CHUNKS:
+                # Possibly edited text: synthesize only changed chunks
+                data["previous"] = {"chunks": previous["chunks"],
+                                    "text": previous["text"],
+                                    "filename": previous["merged"],
+                                    "offsets": previous["offsets"]}
+            self.text_index[text_key] = self.text_id
             self.out_queue.put(data)
             self.button_save.Enabled = False
-            # Create panel in history list
-            p = wx.lib.sized_controls.SizedPanel(self.panel_list,
-                size=(150, 100))
-            p.text_id = data["id"]
-            self.panel_list.SetupScrolling(scroll_x=False)
-            self.panel_list.BackgroundColour = "LIGHT GRAY"
-            p.SetSizerType("vertical")
-            p.BackgroundColour = "WHITE"
-            p_top = wx.lib.sized_controls.SizedPanel(p)
-            p_top.SetSizerType("horizontal")
-            t_date = wx.StaticText(
-                p_top, label="%s\n%s" % (
-                    data["datetime"].strftime("%H:%M %d.%m.%Y"),
-                    data["lang_text"])
-            )
-            t_date.text_id = data["id"]
-            t_date.ForegroundColour = "GRAY"
-            h = wx.HyperlinkCtrl(p_top, id=wx.NewId(), label="Open", url="")
-            h.text_id = data["id"]
-            t_text = wx.StaticText(p, label=text[:200].replace("\n", " "))
-            t_text.text_id = data["id"]
-            t_text.ForegroundColour = "LIGHT GRAY"
-            self.panel_list.Sizer.Insert(0, p, border=2, proportion=1,
-                                         flag=wx.ALL | wx.EXPAND)
-            self.panels_history.append(p)
-            self.Bind(wx.EVT_HYPERLINK, self.on_open_text, h)
-            t_date.Bind(wx.EVT_LEFT_DCLICK, self.on_open_text)
-            t_text.Bind(wx.EVT_LEFT_DCLICK, self.on_open_text)
-            p.Bind(wx.EVT_LEFT_DCLICK, self.on_open_text)
-
-            self.panel_list.Layout()
-            t_text.Wrap(p.Size.width - 5)
-            self.panel_list.Refresh()
-        elif text_present[0]["id"] != self.text_id \
-        and text_present[0]["filenames"]:
-            self.mediactrl.Load(text_present[0]["filenames"][0])
+            self.list_history.add(data)
+            self.trim_history()
+        elif text_present["id"] != self.text_id \
+        and text_present["filenames"]:
+            text_present["used"] = time.time()
+            self.mediactrl.Load(text_present["filenames"][0])
             if self.mc_hack:
                 wx.CallLater(500, self.mediactrl.Play)
         else:
             self.mediactrl.Play()
 
 
-    def on_open_text(self, event):
+    def on_open_text(self, text_id):
         """Handler for opening a text from history, loads and plays it."""
-        self.text_id = event.EventObject.text_id
+        self.text_id = text_id
+        self.mp3_loader.prioritize(self.text_id)
         data = self.data[self.text_id]
+        data["used"] = time.time()
         self.edit_text.Value = data["text"]
         self.list_lang.Value = data["lang_text"]
         if data["filenames"]:
             self.mediactrl.Load(data["filenames"][0])
+        elif data.get("stream"): # Still loading, play as it grows
+            data.update(current=data["stream"], position=-1)
+            self.mediactrl.LoadURI(data["current"])
         if self.mc_hack:
             wx.CallLater(500, self.mediactrl.Play)
 
@@ -367,8 +432,8 @@ class TextSpeakWindow(wx.Frame):
         else:
             self.mediactrl.Play()
         data = self.data[self.text_id]
-        index = data["filenames"].index(data["current"])
-        self.gauge.SetValue(100.0 * (index + 1) / data["count"])
+        if data["position"] >= 0:
+            self.update_gauge(data["position"], data["count"])
 
 
     def on_media_finished(self, event):
@@ -377,15 +442,22 @@ class TextSpeakWindow(wx.Frame):
         chunk if available.
         """
         data = self.data[self.text_id]
-        index = data["filenames"].index(data["current"]) \
-                if data["current"] in data["filenames"] else -1
-        if (index < data["count"] - 1 
-        and len(data["filenames"]) > index + 1):
+        if data["current"] and data["current"] == data.get("stream"):
+            if data["completed"]: # Stream played, put merged file in place
+                self.drop_stream(data)
+                data.update(current=data["filenames"][0], position=0)
+                self.mediactrl.DONTPLAY = True
+                self.mediactrl.Load(data["current"])
+            return
+        index = data["position"] # -1 if not playing a chunk file
+        is_last = (data["count"] is not None and index == data["count"] - 1)
+        if (data["count"] is None or index < data["count"] - 1) \
+        and len(data["filenames"]) > index + 1:
             # Next chunk available, set it playing
             filename = data["filenames"][index + 1]
-            data["current"] = filename
+            data.update(current=filename, position=index + 1)
             self.mediactrl.Load(filename)
-        if index == data["count"] - 1 and not data["completed"]:
+        if is_last and not data["completed"]:
             # All chunks finished, merge them into one
             self.merge_chunks(data)
             data["completed"] = True
@@ -396,32 +468,96 @@ class TextSpeakWindow(wx.Frame):
             self.button_save.Enabled = True
 
 
+    def update_gauge(self, index, count):
+        """Shows progress of chunk at index, pulsing if count not known."""
+        if count:
+            self.gauge.SetValue(100.0 * (index + 1) / count)
+        else:
+            self.gauge.Pulse()
+
+
     def merge_chunks(self, data):
-        """Merges all the audio chunks in data into one file."""
-        fn = "speech_%s_%s.mp3" % (
-             data["lang"], data["datetime"].strftime("%Y%m%d-%H%M%S"))
-        filename_main = unique_path(fn)
-        with open(filename_main, "wb") as f:
-            # MP3s can be simply concatenated together, result is legible.
-            for i, filename in enumerate(data["filenames"]):
-                f.write(open(filename, "rb").read())
-                # Add more silence for separators like commas and periods.
-                silence_count = 0
-                if data["chunks"][i][-1] in [".","?","!"]:
-                    silence_count = conf.SilenceCountLong
-                elif data["chunks"][i][-1] in [",",":",";","(",")"]:
-                    silence_count = conf.SilenceCountShort
-                f.write(base64.decodestring(conf.Silence) * silence_count)
-            for filename in data["filenames"]:
+        """
+        Replaces all the audio chunks in data with one merged file, as
+        assembled by TextToMP3Loader, or merging chunks if not available.
+        """
+        filename_main = data.get("merged")
+        if not filename_main or not os.path.exists(filename_main):
+            fn = "speech_%s_%s.mp3" % (
+                 data["lang"], data["datetime"].strftime("%Y%m%d-%H%M%S"))
+            filename_main = speech.unique_path(fn)
+            speech.merge_chunks(data["filenames"], data["chunks"],
+                                filename_main, data["timings"])
+        for filename in data["filenames"]:
+            try:
+                os.unlink(filename)
+            except Exception: pass
+        data.update(filenames=[filename_main], current=filename_main,
+                    position=0, count=1)
+        self.report_timings(data)
+
+
+    def report_timings(self, data):
+        """
+        Shows time spent in conversion stages as tooltip on the text in
+        history, and logs it into conf.MetricsLog if configured.
+        """
+        data["report"] = data["timings"].get_report()
+        speech.log_metrics(data["timings"], mode="gui", lang=data["lang"],
+                           chunks=len(data["chunks"]), output=data["merged"])
+
+
+    def trim_history(self):
+        """
+        Drops least recently used texts beyond conf.HistoryLimit from
+        history, cancelling their loading and deleting their audio files.
+        The selected text is kept.
+        """
+        excess = len(self.data) - conf.HistoryLimit
+        if not conf.HistoryLimit or excess <= 0:
+            return
+        candidates = sorted((x for x in self.data.values()
+                             if x["id"] != self.text_id),
+                            key=lambda x: x["used"])
+        for data in candidates[:excess]:
+            data["stopped"] = True
+            self.mp3_loader.cancel(data["id"])
+            del self.data[data["id"]]
+            self.unindex_text(data)
+            self.drop_stream(data)
+            self.list_history.remove(data)
+            for f in [x for x in data["filenames"] + [data.get("merged")]
+                      if x]:
                 try:
-                    os.unlink(filename)
-                except Exception: pass
-        data.update(filenames=[filename_main], current=filename_main, count=1)
+                    os.unlink(f)
+                except Exception: pass # Loader removes partial files
+
+
+    def drop_stream(self, data):
+        """Stops serving the progressive playback stream of text, if any."""
+        if data.get("stream_path") and self.mp3_loader.streamer:
+            self.mp3_loader.streamer.remove(data["stream_path"])
+
+
+    def get_text_key(self, lang, text):
+        """Returns the history index key for text, as (lang, text digest)."""
+        return lang, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+    def unindex_text(self, data):
+        """Removes text from history index, if indexed under its ID."""
+        key = self.get_text_key(data["lang"], data["text"])
+        if self.text_index.get(key) == data["id"]:
+            del self.text_index[key]
 
 
     def cleanup(self):
-        """Deletes the MP3 files created during this run."""
-        for f in [i for d in self.data.values() for i in d["filenames"]]:
+        """Cancels loading texts, deletes MP3 files created during this run."""
+        for data in self.data.values():
+            data["stopped"] = True
+        self.mp3_loader.cancel()
+        for f in [i for d in self.data.values()
+                  for i in d["filenames"] + [d.get("merged")] if i]:
             try:
                 os.unlink(f)
             except Exception: pass
@@ -429,150 +565,218 @@ class TextSpeakWindow(wx.Frame):
 
 
 
-class TextToMP3Loader(threading.Thread):
-    """Background thread for loading smaller MP3 files from Google TTS."""
-    GOOGLE_TRANSLATE_URL = "http://translate.google.com/" \
-                           "translate_tts?tl=%s&q=%s"
+class HistoryList(wx.HtmlListBox):
+    """
+    List of spoken texts, newest first. Virtual: only visible rows are
+    rendered, as needed, no controls are created for texts.
+    """
+
+    def __init__(self, parent, on_open):
+        """
+        @param   on_open  callback(text ID) for opening a text from list
+        """
+        wx.HtmlListBox.__init__(self, parent)
+        self.on_open = on_open
+        self.texts = [] # [text data, ], newest first
+        self.tip = None # Tooltip currently shown
+        self.BackgroundColour = "WHITE"
+        self.SetMargins((2, 2))
+        self.Bind(wx.EVT_LISTBOX_DCLICK,
+                  lambda e: self.on_open(self.texts[e.Selection]["id"]))
+        self.Bind(wx.EVT_MOTION, self.on_motion)
+
+
+    def add(self, data):
+        """Adds text to the top of the list."""
+        self.texts.insert(0, data)
+        self.SetItemCount(len(self.texts))
+        self.RefreshAll()
+
+
+    def remove(self, data):
+        """Removes text from the list."""
+        self.texts.remove(data)
+        self.SetItemCount(len(self.texts))
+        self.RefreshAll()
+
+
+    def OnGetItem(self, n):
+        """Returns HTML for the text row at index n."""
+        data = self.texts[n]
+        return ("<table width='100%%' cellspacing='0' cellpadding='0'><tr>"
+                "<td><font color='gray'>%s<br />%s</font></td>"
+                "<td align='right' valign='top'><a href='open'>Open</a></td>"
+                "</tr></table><font color='#A0A0A0'>%s</font>" % (
+                data["datetime"].strftime("%H:%M %d.%m.%Y"),
+                cgi.escape(data["lang_text"]),
+                cgi.escape(data["text"][:200].replace("\n", " "))))
+
+
+    def OnLinkClicked(self, n, link):
+        """Handler for clicking the link in a row, opens the text."""
+        self.on_open(self.texts[n]["id"])
+
+
+    def on_motion(self, event):
+        """
+        Handler for moving mouse over the list, shows conversion timings of
+        the text under mouse as tooltip.
+        """
+        event.Skip()
+        n = self.HitTest(event.Position)
+        tip = self.texts[n].get("report") if 0 <= n < len(self.texts) \
+              else None
+        if tip != self.tip:
+            self.tip = tip
+            self.SetToolTip(wx.ToolTip(tip) if tip else None)
 
 
+
+class TextToMP3Loader(threading.Thread):
+    """
+    Background thread for loading speech MP3 chunks for queued texts,
+    assembling them into one merged file and posting results to the event
+    handler. Separate chunk files are written only for sequential play.
+    Texts are loaded concurrently, the selected text before others.
+    """
+
     def __init__(self, event_handler, in_queue):
         threading.Thread.__init__(self)
         self.daemon = True # Daemon threads do not keep application running
         self.event_handler = event_handler
         self.in_queue = in_queue
         self.is_running = False
-        self.opener = urllib2.build_opener()
-        self.opener.addheaders = [("User-agent",
-            "Mozilla/4.0 (compatible; MSIE 6.0; Windows NT 5.0) "
-            "%s" % conf.Title)]
+        self.loader = None # Created in thread, not to slow down startup
+        self.jobs = {} # {text ID: loader job} for texts being loaded
+        self.streamer = None # Local server for progressive playback
+        if conf.ProgressivePlayback:
+            try:
+                self.streamer = server.StreamServer()
+            except Exception:
+                traceback.print_exc()
         self.start()
 
 
     def run(self):
         self.is_running = True
-        SILENCE_RAW = base64.decodestring(conf.Silence)
-        cached_results = {} # {(language_code, sentence): content, }
+        self.loader = speech.make_loader()
         while self.is_running:
             data = self.in_queue.get()
-            text_chunks = self.parse_text(data["text"].encode("utf-8"))
-            for i, sentence in enumerate(text_chunks):
-                cachekey = (data["lang"], sentence)
-                if cachekey in cached_results:
-                    content = cached_results[cachekey]
-                elif conf.SilenceMarker in sentence.lower():
-                    silence_count = sentence.lower().count(conf.SilenceMarker)
-                    content = 2 * silence_count * SILENCE_RAW
-                else:
-                    content, tries, MAX_TRIES = None, 0, 3
-                    url = self.GOOGLE_TRANSLATE_URL % (
-                          data["lang"], urllib2.quote(sentence))
-                    while tries < MAX_TRIES:
-                        try:
-                            tries += 1
-                            content = self.opener.open(url).read()
-                        except Exception: pass
-                    if content is None and tries >= MAX_TRIES:
-                        error = "Error accessing the Google Translate " \
-                                "online service.\n\nURL: %s\n\n%s" % (
-                                url.replace("?", "?\n"), traceback.format_exc())
-                        event = ResultEvent(TextId=data["id"], Error=error)
-                        wx.PostEvent(self.event_handler, event)
-                        break # break for i, sentence in enumerate(text_chunks)
-                filename = "speech_temp_%s_%d_%02d.mp3" % \
-                           (data["lang"], data["id"], i)
-                filename = unique_path(filename)
-                with open(filename, "wb") as f:
-                    f.write(content)
-                event = ResultEvent(TextId=data["id"], Chunks=text_chunks,
-                    Count=len(text_chunks), Index=i, Filename=filename)
+            if data["stopped"]: # Dropped from history before loading
+                continue # while self.is_running
+            self.jobs[data["id"]] = self.loader.make_job()
+            data["timings"] = self.jobs[data["id"]]["timings"]
+            self.prioritize(data["id"]) # Latest text is the one selected
+            thread = threading.Thread(target=self.load,
+                                      args=(data, self.jobs[data["id"]]))
+            thread.daemon = True
+            thread.start()
+
+
+    def prioritize(self, text_id):
+        """Sets text to load before all other texts, if still loading."""
+        for id, job in self.jobs.items():
+            priority = speech.PRIORITY_INTERACTIVE if id == text_id \
+                       else speech.PRIORITY_NORMAL
+            self.loader.set_priority(job, priority)
+
+
+    def cancel(self, text_id=None):
+        """Cancels loading the text, or all texts if no ID given."""
+        for id, job in self.jobs.items():
+            if text_id in (None, id):
+                self.loader.cancel(job)
+
+
+    def load(self, data, job):
+        """Loads speech for the text, posting a ResultEvent for each chunk."""
+        # Append chunks into the merged file as they arrive, keeping
+        # chunk audio in memory only, unless playing chunk by chunk
+        filename_merged = speech.unique_path("speech_%s_%s.mp3" % (
+            data["lang"], data["datetime"].strftime("%Y%m%d-%H%M%S")))
+        timings = job["timings"]
+        writer = speech.SpeechWriter(filename_merged, timings)
+        data["offsets"] = writer.offsets # For splicing edited versions
+        stream = self.streamer.add(filename_merged) \
+                 if data["progressive"] else {}
+        previous, count = data.pop("previous", None), None
+        try:
+            if previous and os.path.exists(previous["filename"]) \
+            and speech.is_edited(previous["text"], data["text"]):
+                chunks = self.loader.parse_text(data["text"].encode("utf-8"))
+                results = self.loader.load_edit(chunks, data["lang"],
+                                                previous, job)
+            else:
+                results = self.loader.load(data["text"], data["lang"], job)
+            for i, chunk, content, count in results:
+                filename = None
+                if data["sequential"]: # Separate file for playing chunk
+                    fd, filename = tempfile.mkstemp(suffix=".mp3",
+                        prefix="speech_temp_%s_%d_%02d_" %
+                               (data["lang"], data["id"], i))
+                    with os.fdopen(fd, "wb") as f, timings.timer("write"):
+                        f.write(content)
+                writer.write(chunk, content)
+                if i == (count or 0) - 1: # Total known by last chunk
+                    writer.close()
+                    if stream:
+                        stream["finished"].set()
+                elif stream: # Make chunk available for progressive play
+                    writer.flush()
+                event = ResultEvent(TextId=data["id"], Chunk=chunk,
+                    Count=count, Index=i, Filename=filename,
+                    Merged=filename_merged, Stream=stream.get("url"),
+                    StreamPath=stream.get("path"), Posted=time.time())
                 wx.PostEvent(self.event_handler, event)
-                cached_results[cachekey] = content
+            writer.close()
+            if data["stopped"]: # Cancelled, discard partial file
+                try:
+                    os.unlink(filename_merged)
+                except Exception: pass
+        except Exception as e: # Unexpected errors to end loading as well
+            if not isinstance(e, speech.SpeechError):
+                traceback.print_exc()
+            writer.close()
+            data["offsets"] = None # Failed chunks are not to be reused
+            # Keep output if some chunks succeeded, failed ones being silence
+            errors = getattr(e, "errors", None) or []
+            if not 0 < len(errors) < (count or 0):
+                try:
+                    os.unlink(filename_merged)
+                except Exception: pass
+            event = ResultEvent(TextId=data["id"], Error=str(e))
+            wx.PostEvent(self.event_handler, event)
+        finally:
+            self.jobs.pop(data["id"], None)
+            if stream:
+                stream["finished"].set()
+                if not os.path.exists(filename_merged): # Discarded
+                    self.streamer.remove(stream["path"])
 
 
-    def parse_text(self, text):
-        """
-        Returns a list of sentences with less than 100 characters.
+def report_startup(window, startup, close):
+    """
+    Prints startup timings to stderr, once the window is ready for input.
 
-        Modified @from http://glowingpython.blogspot.com/2012/11/
-        text-to-speech-with-correct-intonation.html
-        """
-        MAXLEN = 100
-        sentences = []
-        punct = [",",":",";",".","–","?","!","(",")"] # Interpunctuation marks
-        text = text.replace("\r", " ").replace("\t", " ") # Remove CR and tabs
-        words = text.split(" ") if len(text) > MAXLEN else []
-        sentence = "" if len(text) > MAXLEN else text
-
-        # Preprocess list for silence markers
-        if conf.SilenceMarker in text:
-            words_new = []
-            if not words and sentence: # Was too short to be cut initially
-                words = text.split(" ")
-                sentence = ""
-            for w in filter(None, words):
-                if conf.SilenceMarker not in w.lower():
-                    words_new.append(w)
-                else:
-                    text_chunks = w.lower().split(conf.SilenceMarker)
-                    for i, part in enumerate(text_chunks):
-                        if part:
-                            words_new.append(part)
-                            if i < len(text_chunks) - 1:
-                                words_new.append(conf.SilenceMarker)
-                        else:
-                            if words_new and conf.SilenceMarker in words_new[-1]:
-                                words_new[-1] += conf.SilenceMarker
-                            else:
-                                words_new.append(conf.SilenceMarker)
-            words = words_new
-
-        for w in words:
-            if conf.SilenceMarker in w:
-                if sentence:
-                    sentences.append(sentence.strip())
-                sentences.append(w)
-                sentence = ""
-            elif w[-1] in punct or w[0] in punct: # Encountered punctuation
-                if w[-1] in punct and (len(sentence) + len(w) + 1 < MAXLEN):
-                    # Word ends with punct and sentence can still be added to
-                    sentences.append(sentence.strip() + " " + w.strip())
-                    sentence = "" # Save sentence and word, start new sentence
-                elif w[0] in punct and w[-1] not in punct:
-                     # Word starts with punctuation, like '('
-                    sentences.append(sentence.strip()) # Save current sentence
-                    sentence = w # Start a new sentence with punct and word
-                else: # word ends with punct and sentence already long enough
-                    sentences.extend([sentence.strip(), w.strip()])
-                    sentence = "" 
-            else:
-                if (len(sentence) + len(w) + 1 < MAXLEN): # Sentence still
-                    sentence += " " + w                   # short enough
-                else: # Sentence too long
-                    sentences.append(sentence.strip())
-                    sentence = w # Start a new sentence with the word
-        if sentence:
-            sentences.append(sentence.strip())
-        return sentences
+    @param   close  whether to close the window after, for measuring only
+    """
+    startup.lap("first events")
+    sys.stderr.write("Startup timings:\n%s\n" % startup.get_report())
+    if close: # Measuring only: leave configuration as it was
+        window.save_on_exit = False
+        window.Close()
 
 
-def unique_path(pathname):
-    """
-    Returns a unique version of the path. If a file or directory with the
-    same name already exists, returns a unique version
-    (e.g. "C:\config (2).sys" if ""C:\config.sys" already exists).
-    """
-    result = pathname
-    base, ext = os.path.splitext(result)
-    counter = 2
-    while os.path.exists(result):
-        result = "%s (%s)%s" % (base, counter, ext)
-        counter += 1
-    return result
-
-    
 if "__main__" == __name__:
+    measure = "--startup" in sys.argv[1:]
+    startup = speech.Timings()
+    startup.started = startup.last = STARTED
+    startup.lap("imports")
     app = wx.App(0)
-    window = TextSpeakWindow()
+    startup.lap("wx application")
+    window = TextSpeakWindow(startup)
+    if measure:
+        wx.CallAfter(report_startup, window, startup, True)
     try:
         app.MainLoop()
     except Exception, e: